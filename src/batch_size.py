@@ -0,0 +1,81 @@
+import threading
+from typing import List
+import supervisely as sly
+
+
+class AdaptiveBatchSize:
+    # Chooses the size of the next batch from measured request latency, bytes per item and
+    # errors: the size grows while batches finish faster than target_latency and shrinks
+    # when batches are slow, too heavy or fail (e.g. timeouts). It is shared between
+    # workers, so measurements of all running datasets are taken into account.
+
+    def __init__(
+        self,
+        name: str,
+        initial: int = 50,
+        min_size: int = 1,
+        max_size: int = 500,
+        target_latency: float = 5.0,
+        max_batch_bytes: int = 256 * 1024 * 1024,
+    ):
+        self.name = name
+        self.min_size = min_size
+        self.max_size = max_size
+        self.target_latency = target_latency
+        self.max_batch_bytes = max_batch_bytes
+        self._size = max(min_size, min(max_size, initial))
+        self._error_rate = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def record(self, count: int, elapsed: float, nbytes: int = None, error: bool = False):
+        if count == 0:
+            return
+        with self._lock:
+            self._error_rate = 0.8 * self._error_rate + 0.2 * (1.0 if error else 0.0)
+            if error:
+                new_size = self._size // 2
+            else:
+                item_latency = max(elapsed, 1e-3) / count
+                desired = self.target_latency / item_latency
+                if nbytes is not None and nbytes > 0:
+                    desired = min(desired, self.max_batch_bytes / (nbytes / count))
+                if self._error_rate > 0.1:
+                    # don't grow until errors calm down
+                    desired = min(desired, self._size)
+                # move halfway to the desired size, but at most twice at once
+                new_size = min(int((self._size + desired) / 2), self._size * 2)
+            self._set(max(self.min_size, min(self.max_size, new_size)), count, elapsed, nbytes)
+
+    def _set(self, new_size: int, count: int, elapsed: float, nbytes: int):
+        if new_size == self._size:
+            return
+        sly.logger.info(
+            f"Batch size for {self.name} changed: {self._size} -> {new_size}",
+            extra={
+                "items": count,
+                "seconds": round(elapsed, 2),
+                "bytes": nbytes,
+                "error_rate": round(self._error_rate, 2),
+            },
+        )
+        self._size = new_size
+
+    def batches(self, items: List, sizes: List[int] = None):
+        # split items into batches, size of every batch is taken at the moment it is requested
+        i = 0
+        while i < len(items):
+            count = self._size
+            if sizes is not None:
+                batch_bytes, j = 0, i
+                while j < len(items) and j - i < count:
+                    if j > i and batch_bytes + (sizes[j] or 0) > self.max_batch_bytes:
+                        break
+                    batch_bytes += sizes[j] or 0
+                    j += 1
+                count = j - i
+            yield items[i : i + count]
+            i += count
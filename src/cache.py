@@ -0,0 +1,215 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Tuple
+import supervisely as sly
+from supervisely.api.file_api import FileInfo
+from supervisely.api.team_api import TeamInfo
+from supervisely.api.workspace_api import WorkspaceInfo
+from supervisely.api.project_api import ProjectInfo
+from supervisely.api.dataset_api import DatasetInfo
+from supervisely.api.user_api import UserInfo
+from supervisely.api.labeling_job_api import LabelingJobInfo
+
+# seconds for which metadata read from an instance is reused by all UI modules and import jobs
+CACHE_TTL = float(os.environ.get("CACHE_TTL", 300))
+# number of Team Files directory listings kept for the files browser
+DIR_CACHE_SIZE = int(os.environ.get("DIR_CACHE_SIZE", 256))
+# subdirectories of the opened directory are listed in background, at most DIR_PREFETCH_LIMIT
+DIR_PREFETCH_WORKERS = int(os.environ.get("DIR_PREFETCH_WORKERS", 4))
+DIR_PREFETCH_LIMIT = 50
+
+
+class MetaCache:
+    # Teams, workspaces, projects, datasets, members, roles and metas of both instances are
+    # read by the team table, the entity selector and every import stage. Entries are kept
+    # for ttl seconds per instance, code that changes an entity on the instance invalidates
+    # it explicitly. None results are not cached, so "get or create" code sees new entities.
+
+    def __init__(self, ttl: float = CACHE_TTL):
+        self.ttl = ttl
+        self._entries: Dict[Tuple[str, str, str], Tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, api: sly.Api, kind: str, key, loader: Callable[[], Any]):
+        entry_key = (api.server_address, kind, str(key))
+        with self._lock:
+            entry = self._entries.get(entry_key)
+            if entry is not None and entry[0] > time.monotonic():
+                return entry[1]
+        value = loader()
+        if value is not None:
+            self.put(api, kind, key, value)
+        return value
+
+    def put(self, api: sly.Api, kind: str, key, value):
+        with self._lock:
+            expires_at = time.monotonic() + self.ttl
+            self._entries[(api.server_address, kind, str(key))] = (expires_at, value)
+
+    def invalidate(self, api: sly.Api, kind: str = None, key=None):
+        # drop one entry, all entries of the kind or everything cached for the instance
+        with self._lock:
+            for entry_key in list(self._entries):
+                server_address, entry_kind, entry_id = entry_key
+                if server_address != api.server_address:
+                    continue
+                if kind is not None and entry_kind != kind:
+                    continue
+                if key is not None and entry_id != str(key):
+                    continue
+                del self._entries[entry_key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+cache = MetaCache()
+
+
+def get_teams(api: sly.Api) -> List[TeamInfo]:
+    teams = cache.get(api, "teams", "", api.team.get_list)
+    for team in teams:
+        cache.put(api, "team", team.id, team)
+    return teams
+
+
+def get_team(api: sly.Api, team_id: int) -> TeamInfo:
+    return cache.get(api, "team", team_id, lambda: api.team.get_info_by_id(team_id))
+
+
+def get_team_by_name(api: sly.Api, name: str) -> TeamInfo:
+    return cache.get(api, "team_by_name", name, lambda: api.team.get_info_by_name(name))
+
+
+def get_workspaces(api: sly.Api, team_id: int) -> List[WorkspaceInfo]:
+    workspaces = cache.get(api, "workspaces", team_id, lambda: api.workspace.get_list(team_id))
+    for workspace in workspaces:
+        cache.put(api, "workspace", workspace.id, workspace)
+    return workspaces
+
+
+def get_workspace(api: sly.Api, workspace_id: int) -> WorkspaceInfo:
+    return cache.get(
+        api, "workspace", workspace_id, lambda: api.workspace.get_info_by_id(workspace_id)
+    )
+
+
+def get_projects(api: sly.Api, workspace_id: int) -> List[ProjectInfo]:
+    projects = cache.get(api, "projects", workspace_id, lambda: api.project.get_list(workspace_id))
+    for project in projects:
+        cache.put(api, "project", project.id, project)
+    return projects
+
+
+def get_project(api: sly.Api, project_id: int) -> ProjectInfo:
+    return cache.get(api, "project", project_id, lambda: api.project.get_info_by_id(project_id))
+
+
+def get_project_meta(api: sly.Api, project_id: int) -> dict:
+    return cache.get(api, "meta", project_id, lambda: api.project.get_meta(project_id))
+
+
+def get_datasets(api: sly.Api, project_id: int) -> List[DatasetInfo]:
+    datasets = cache.get(api, "datasets", project_id, lambda: api.dataset.get_list(project_id))
+    for dataset in datasets:
+        cache.put(api, "dataset", dataset.id, dataset)
+    return datasets
+
+
+def get_dataset(api: sly.Api, dataset_id: int) -> DatasetInfo:
+    return cache.get(api, "dataset", dataset_id, lambda: api.dataset.get_info_by_id(dataset_id))
+
+
+def get_team_members(api: sly.Api, team_id: int) -> List[UserInfo]:
+    return cache.get(api, "members", team_id, lambda: api.user.get_team_members(team_id))
+
+
+def get_labeling_jobs(api: sly.Api, team_id: int) -> List[LabelingJobInfo]:
+    return cache.get(api, "jobs", team_id, lambda: api.labeling_job.get_list(team_id))
+
+
+def get_roles(api: sly.Api) -> list:
+    return cache.get(api, "roles", "", api.role.get_list)
+
+
+class DirectoryCache:
+    # Listings of Team Files directories for the files browser. Least recently used listings
+    # are evicted once there are more than max_size of them. Directories that are likely to
+    # be opened next are listed in background by prefetch, a request for a directory that is
+    # being prefetched waits for that listing instead of sending its own.
+
+    def __init__(
+        self,
+        max_size: int = DIR_CACHE_SIZE,
+        ttl: float = CACHE_TTL,
+        max_workers: int = DIR_PREFETCH_WORKERS,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._listings: OrderedDict = OrderedDict()
+        self._pending: Dict[Tuple[str, int, str], Future] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    @staticmethod
+    def _key(api: sly.Api, team_id: int, path: str) -> Tuple[str, int, str]:
+        return (api.server_address, int(team_id), path.rstrip("/") + "/")
+
+    def _get_cached(self, key):
+        entry = self._listings.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self._listings[key]
+            return None
+        self._listings.move_to_end(key)
+        return entry[1]
+
+    def _load(self, api: sly.Api, team_id: int, path: str) -> List[FileInfo]:
+        files = api.file.list(team_id, path, False, return_type="fileinfo")
+        key = self._key(api, team_id, path)
+        with self._lock:
+            self._listings[key] = (time.monotonic() + self.ttl, files)
+            self._listings.move_to_end(key)
+            while len(self._listings) > self.max_size:
+                self._listings.popitem(last=False)
+        return files
+
+    def list(self, api: sly.Api, team_id: int, path: str) -> List[FileInfo]:
+        key = self._key(api, team_id, path)
+        with self._lock:
+            files = self._get_cached(key)
+            future = self._pending.get(key)
+        if files is not None:
+            return files
+        if future is not None:
+            try:
+                return future.result()
+            except Exception:
+                pass
+        return self._load(api, team_id, path)
+
+    def prefetch(self, api: sly.Api, team_id: int, paths: List[str]):
+        for path in paths[:DIR_PREFETCH_LIMIT]:
+            key = self._key(api, team_id, path)
+            with self._lock:
+                if key in self._pending or self._get_cached(key) is not None:
+                    continue
+                future = self._executor.submit(self._load, api, team_id, path)
+                self._pending[key] = future
+            future.add_done_callback(lambda _, key=key: self._forget(key))
+
+    def _forget(self, key):
+        with self._lock:
+            self._pending.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._listings.clear()
+
+
+dir_cache = DirectoryCache()
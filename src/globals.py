@@ -12,3 +12,5 @@ api.headers.pop("x-task-id", None)
 
 foreign_api: sly.Api = None
 team_id = sly.env.team_id()
+# import journal is kept here to survive app restarts
+data_dir = sly.app.get_synced_data_dir()
@@ -0,0 +1,113 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from typing import Iterable, Optional, Set
+import supervisely as sly
+
+
+class Journal:
+    # Local record of completed parts of the import: projects, datasets, items, team files
+    # and members. A restarted import skips everything recorded here without asking either
+    # instance about it. Keys are ids/paths on the foreign instance. Settings of the import
+    # (selected entities and collision options) are recorded too, the journal is valid
+    # only for an import with the same settings.
+
+    SETTINGS = "settings"
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS checkpoints ("
+                "kind TEXT NOT NULL, parent TEXT NOT NULL, key TEXT NOT NULL, "
+                "PRIMARY KEY (kind, parent, key))"
+            )
+
+    def mark_done(self, kind: str, keys: Iterable, parent="") -> None:
+        rows = [(kind, str(parent), str(key)) for key in keys]
+        if len(rows) == 0:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR IGNORE INTO checkpoints VALUES (?, ?, ?)", rows)
+
+    def is_done(self, kind: str, key, parent="") -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM checkpoints WHERE kind = ? AND parent = ? AND key = ?",
+                (kind, str(parent), str(key)),
+            ).fetchone()
+        return row is not None
+
+    def get_done(self, kind: str, parent="") -> Set[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key FROM checkpoints WHERE kind = ? AND parent = ?",
+                (kind, str(parent)),
+            ).fetchall()
+        return set([row[0] for row in rows])
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM checkpoints WHERE kind != ? LIMIT 1", (self.SETTINGS,)
+            ).fetchone()
+        return row is None
+
+    def get_settings(self) -> Optional[str]:
+        settings = self.get_done(self.SETTINGS)
+        return settings.pop() if len(settings) > 0 else None
+
+    def set_settings(self, settings: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM checkpoints WHERE kind = ?", (self.SETTINGS,))
+        self.mark_done(self.SETTINGS, [settings])
+
+    def clear(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM checkpoints")
+
+
+def get_journal_path(
+    data_dir: str, server_address: str, team_id: int, res_server_address: str
+) -> str:
+    # one journal per foreign team and destination instance
+    key = f"{server_address}|{team_id}|{res_server_address}"
+    key_hash = hashlib.md5(key.encode("utf-8")).hexdigest()[:12]
+    return os.path.join(data_dir, f"journal_{key_hash}.db")
+
+
+def find_journal(
+    data_dir: str, server_address: str, team_id: int, res_server_address: str
+) -> Optional[Journal]:
+    # journal left by an import that didn't finish
+    path = get_journal_path(data_dir, server_address, team_id, res_server_address)
+    if not os.path.exists(path):
+        return None
+    journal = Journal(path)
+    if journal.is_empty():
+        return None
+    return journal
+
+
+def open_journal(
+    data_dir: str, server_address: str, team_id: int, res_server_address: str, settings: dict
+) -> Journal:
+    sly.fs.mkdir(data_dir)
+    journal = Journal(get_journal_path(data_dir, server_address, team_id, res_server_address))
+    settings = json.dumps(settings, sort_keys=True, default=str)
+    if not journal.is_empty():
+        if journal.get_settings() == settings:
+            sly.logger.info(f"Resuming import from journal: {journal.path}")
+        else:
+            # other entities or collision options: checkpoints of that import don't apply
+            sly.logger.warn(
+                "Journal of the previous import was made with other settings. "
+                "Import starts from scratch."
+            )
+            journal.clear()
+    journal.set_settings(settings)
+    return journal
@@ -0,0 +1,171 @@
+import queue
+import threading
+from typing import Any, Callable, Iterable
+import supervisely as sly
+
+_DONE = object()
+
+
+class ByteBudget:
+    # limits the amount of item bytes held in memory by all running pipelines at once
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._used = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, size: int, stop: threading.Event = None) -> bool:
+        size = min(size, self.capacity)
+        with self._cond:
+            while self._used + size > self.capacity:
+                if stop is not None and stop.is_set():
+                    return False
+                self._cond.wait(timeout=0.5)
+            self._used += size
+            return True
+
+    def release(self, size: int):
+        size = min(size, self.capacity)
+        with self._cond:
+            self._used = max(0, self._used - size)
+            self._cond.notify_all()
+
+
+def run_pipeline(
+    items: Iterable,
+    produce: Callable[[Any], Any],
+    consume: Callable[[Any, Any], None],
+    queue_depth: int = 4,
+    stop: threading.Event = None,
+):
+    # produce(item) runs in a background thread, consume(item, result) runs in the calling thread.
+    # At most queue_depth produced results are waiting for consume at any moment.
+    # stop is set once the pipeline is finished or failed, producers may use it to stop waiting.
+    results = queue.Queue(maxsize=max(1, queue_depth))
+    if stop is None:
+        stop = threading.Event()
+
+    def put(entry):
+        while not stop.is_set():
+            try:
+                results.put(entry, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def producer():
+        try:
+            for item in items:
+                if stop.is_set():
+                    return
+                if not put((item, produce(item), None)):
+                    return
+        except Exception as e:
+            put((None, None, e))
+            return
+        put(_DONE)
+
+    thread = threading.Thread(target=producer, daemon=True)
+    thread.start()
+    try:
+        while True:
+            try:
+                entry = results.get(timeout=0.5)
+            except queue.Empty:
+                if not thread.is_alive():
+                    # producer was stopped from outside before all items were produced
+                    break
+                continue
+            if entry is _DONE:
+                break
+            item, result, error = entry
+            if error is not None:
+                raise error
+            consume(item, result)
+    finally:
+        stop.set()
+        thread.join()
+
+
+def limit_requests(api: sly.Api, max_requests: int) -> sly.Api:
+    # limit number of requests sent to the instance at the same time by all workers
+    if getattr(api, "_requests_semaphore", None) is not None:
+        return api
+    semaphore = threading.BoundedSemaphore(max_requests)
+    post, get = api.post, api.get
+
+    def limited_post(*args, **kwargs):
+        with semaphore:
+            return post(*args, **kwargs)
+
+    def limited_get(*args, **kwargs):
+        with semaphore:
+            return get(*args, **kwargs)
+
+    api.post, api.get = limited_post, limited_get
+    api._requests_semaphore = semaphore
+    return api
+
+
+class ChunkedStream:
+    # File-like wrapper of a streamed response, lets a multipart upload read the body
+    # of a download while it is being received. len is read by the encoder as the number
+    # of bytes left in the stream, at most one chunk of the body is held in memory.
+
+    def __init__(self, response, size: int, chunk_size: int):
+        self._size = int(size)
+        self._chunks = response.iter_content(chunk_size=chunk_size)
+        self._chunk = b""
+        self._offset = 0
+        self._position = 0
+
+    @property
+    def len(self) -> int:
+        return max(0, self._size - self._position)
+
+    def read(self, size: int = -1) -> bytes:
+        parts = []
+        left = size
+        while size < 0 or left > 0:
+            if self._offset >= len(self._chunk):
+                self._chunk = next(self._chunks, None)
+                self._offset = 0
+                if self._chunk is None:
+                    self._chunk = b""
+                    break
+                continue
+            end = len(self._chunk) if size < 0 else min(len(self._chunk), self._offset + left)
+            parts.append(self._chunk[self._offset : end])
+            left -= end - self._offset
+            self._offset = end
+        data = b"".join(parts)
+        self._position += len(data)
+        return data
+
+    def tell(self) -> int:
+        return self._position
+
+
+class SharedProgress:
+    # stands in for Progress widget when several tasks run at once: instead of opening
+    # its own bar, every task reports to the one bar opened by the scheduler
+
+    def __init__(self, pbar):
+        self._pbar = pbar
+        self._lock = threading.Lock()
+
+    def __call__(self, message: str = None, *args, **kwargs):
+        if message is not None:
+            sly.logger.info(message)
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def update(self, n: int = 1):
+        with self._lock:
+            self._pbar.update(n)
@@ -0,0 +1,191 @@
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List
+import anyio
+import requests
+import supervisely as sly
+from supervisely.io.network_exceptions import RETRY_STATUS_CODES
+
+# number of attempts for every item, delays grow exponentially from RETRY_BASE_DELAY
+# up to RETRY_MAX_DELAY seconds and are randomized to spread retries of the workers
+RETRY_ATTEMPTS = int(os.environ.get("RETRY_ATTEMPTS", 5))
+RETRY_BASE_DELAY = float(os.environ.get("RETRY_BASE_DELAY", 1))
+RETRY_MAX_DELAY = float(os.environ.get("RETRY_MAX_DELAY", 60))
+
+# instance is considered degraded after BREAKER_THRESHOLD retriable failures in a row,
+# all workers pause requests to it for BREAKER_COOLDOWN seconds
+BREAKER_THRESHOLD = int(os.environ.get("BREAKER_THRESHOLD", 5))
+BREAKER_COOLDOWN = float(os.environ.get("BREAKER_COOLDOWN", 30))
+BREAKER_MAX_COOLDOWN = 300
+
+
+def is_server_error(exc: Exception) -> bool:
+    # connection problems, timeouts, throttling and server errors say the instance is degraded
+    if isinstance(exc, (anyio.EndOfStream, TimeoutError, ConnectionError)):
+        return True
+    if isinstance(exc, requests.exceptions.HTTPError):
+        response = getattr(exc, "response", None)
+        return response is not None and response.status_code in RETRY_STATUS_CODES
+    if isinstance(
+        exc,
+        (
+            requests.exceptions.ConnectionError,
+            requests.exceptions.Timeout,
+            requests.exceptions.ChunkedEncodingError,
+            requests.exceptions.RetryError,
+        ),
+    ):
+        return True
+    return False
+
+
+def is_retriable(exc: Exception) -> bool:
+    # server errors may pass by themselves, a missing local file (e.g. a download that
+    # didn't finish) affects only its item, everything else (invalid requests, missing
+    # entities, bugs) is fatal
+    return is_server_error(exc) or isinstance(exc, FileNotFoundError)
+
+
+def backoff_delay(attempt: int) -> float:
+    delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempt - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class CircuitBreaker:
+    # Shared by all workers talking to the same instance. Once the instance fails too often
+    # the breaker opens and every worker waits before its next request instead of adding
+    # load to the degraded server. After the cooldown requests are let through again:
+    # a success closes the breaker, a failure opens it for a twice longer cooldown.
+
+    def __init__(
+        self, name: str, threshold: int = BREAKER_THRESHOLD, cooldown: float = BREAKER_COOLDOWN
+    ):
+        self.name = name
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._failures = 0
+        self._opened_until = 0.0
+        self._current_cooldown = cooldown
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return time.monotonic() < self._opened_until
+
+    def wait(self):
+        while True:
+            with self._lock:
+                left = self._opened_until - time.monotonic()
+            if left <= 0:
+                return
+            time.sleep(min(left, 1))
+
+    def record_success(self):
+        with self._lock:
+            if self._failures >= self.threshold:
+                sly.logger.info(f"Instance {self.name} is available again")
+            self._failures = 0
+            self._current_cooldown = self.cooldown
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._failures < self.threshold or time.monotonic() < self._opened_until:
+                return
+            self._opened_until = time.monotonic() + self._current_cooldown
+            sly.logger.warn(
+                f"Instance {self.name} is degraded. "
+                f"Requests are paused for {int(self._current_cooldown)}s",
+                extra={"failures": self._failures},
+            )
+            self._current_cooldown = min(self._current_cooldown * 2, BREAKER_MAX_COOLDOWN)
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(api: sly.Api) -> CircuitBreaker:
+    with _breakers_lock:
+        breaker = _breakers.get(api.server_address)
+        if breaker is None:
+            breaker = CircuitBreaker(api.server_address)
+            _breakers[api.server_address] = breaker
+        return breaker
+
+
+def retry_items(
+    func: Callable[[List], List],
+    items: List,
+    apis: List[sly.Api],
+    is_done: Callable = None,
+    find_done: Callable[[List], List] = None,
+    attempts: int = RETRY_ATTEMPTS,
+    name: str = "request",
+) -> List:
+    # Calls func(items) and returns its results in the order of items. If the call fails with
+    # a retriable error, only failed items are retried: items that is_done(item) reports as
+    # finished are dropped and the rest is split in halves, so a single bad item doesn't
+    # make the whole batch transfer again. Results of dropped items are None.
+    # Calls that create items aren't idempotent: find_done(items) returns results of items
+    # that the failed call managed to create (None for the rest), they are not sent again.
+    # Breakers count one failure per call, however many parts of the batch fail.
+    breakers = [get_breaker(api) for api in apis]
+    is_failure_recorded = False
+    results = [None] * len(items)
+    pending = deque([(list(range(len(items))), 1)])
+    while len(pending) > 0:
+        indices, attempt = pending.popleft()
+        if is_done is not None and attempt > 1:
+            indices = [i for i in indices if not is_done(items[i])]
+        if len(indices) == 0:
+            continue
+        for breaker in breakers:
+            breaker.wait()
+        try:
+            if find_done is not None and attempt > 1:
+                done_results = find_done([items[i] for i in indices])
+                for i, result in zip(indices, done_results):
+                    results[i] = result
+                indices = [i for i, result in zip(indices, done_results) if result is None]
+                if len(indices) == 0:
+                    continue
+            batch_results = func([items[i] for i in indices])
+        except Exception as e:
+            if not is_retriable(e):
+                raise
+            if is_server_error(e) and not is_failure_recorded:
+                for breaker in breakers:
+                    breaker.record_failure()
+                is_failure_recorded = True
+            if attempt >= attempts:
+                raise
+            delay = backoff_delay(attempt)
+            sly.logger.warn(
+                f"Error occurred during {name}. "
+                f"Retrying {len(indices)} items in {delay:.1f}s... {attempt}/{attempts}",
+                extra={"error": repr(e)},
+            )
+            time.sleep(delay)
+            if len(indices) > 1:
+                middle = len(indices) // 2
+                pending.append((indices[:middle], attempt + 1))
+                pending.append((indices[middle:], attempt + 1))
+            else:
+                pending.append((indices, attempt + 1))
+            continue
+        for breaker in breakers:
+            breaker.record_success()
+        if batch_results is None:
+            continue
+        for i, result in zip(indices, batch_results):
+            results[i] = result
+    return results
+
+
+def retry_call(apis: List[sly.Api], name: str, func: Callable, *args, **kwargs):
+    # single request that can't be split into items
+    return retry_items(lambda _: [func(*args, **kwargs)], [None], apis, name=name)[0]
@@ -4,6 +4,7 @@ from supervisely.app.widgets import Card, Container, Button, Checkbox, Input, Te
 import src.globals as g
 import src.ui.team_selector as team_selector
 import src.ui.entity_selector as entity_selector
+from src.cache import cache, dir_cache
 
 sly_address_text = Text("<b>Server Address</b>")
 sly_address_input = Input(
@@ -166,6 +167,9 @@ def connect():
     #     sly_address_input.enable()
     #     return
 
+    # metadata cached during the previous connection may be outdated
+    cache.clear()
+    dir_cache.clear()
     team_selector.build_table(g.foreign_api)
     team_selector.card.unlock()
     connect_message.set(f"Connected to {g.foreign_api.server_address} as {user.login}", "success")
@@ -9,6 +9,18 @@ from supervisely.api.team_api import TeamInfo
 from supervisely.api.project_api import ProjectInfo
 from supervisely.api.dataset_api import DatasetInfo
 from src.ui.entities.workspaces import process_type_map
+from src.cache import (
+    cache,
+    get_dataset,
+    get_labeling_jobs,
+    get_project,
+    get_project_meta,
+    get_roles,
+    get_team,
+    get_team_by_name,
+    get_team_members,
+    get_workspace,
+)
 
 
 def import_labeling_jobs(
@@ -19,15 +31,16 @@ def import_labeling_jobs(
     progress_job: Progress,
     progress_items: Progress,
 ):
-    team = foreign_api.team.get_info_by_id(team_id)
-    res_team = api.team.get_info_by_name(team.name)
+    team = get_team(foreign_api, team_id)
+    res_team = get_team_by_name(api, team.name)
     if res_team is None:
         res_team = api.team.create(team.name, description=team.description)
+        cache.put(api, "team_by_name", res_team.name, res_team)
 
     existing_jobs: List[LabelingJobInfo] = api.labeling_job.get_list(team_id=res_team.id)
     existing_jobs_names = [job.name for job in existing_jobs]
 
-    incoming_jobs: List[LabelingJobInfo] = foreign_api.labeling_job.get_list(team_id=team.id)
+    incoming_jobs: List[LabelingJobInfo] = get_labeling_jobs(foreign_api, team.id)
     with progress_job(message="Importing labeling jobs", total=len(incoming_jobs)) as pbar:
         for incoming_job in incoming_jobs:
             if incoming_job.name in existing_jobs_names:
@@ -101,7 +114,7 @@ def get_or_create_members(
     creator, annotator, reviewer = None, None, None
     # get members of labeling job
     members_to_add: List[UserInfo] = []
-    incoming_team_members: List[UserInfo] = foreign_api.user.get_team_members(job.team_id)
+    incoming_team_members: List[UserInfo] = get_team_members(foreign_api, job.team_id)
     for member in incoming_team_members:
         if member.id in [creator_id, annotator_id, reviewer_id]:
             if member.id == creator_id:
@@ -112,14 +125,15 @@ def get_or_create_members(
                 reviewer = member
             members_to_add.append(member)
 
-    existing_team_members: List[UserInfo] = api.user.get_team_members(team.id)
+    existing_team_members: List[UserInfo] = get_team_members(api, team.id)
     existing_team_members_names = [member.login for member in existing_team_members]
     existing_members_map = {
         member.login: {"id": member.id, "role": member.role} for member in existing_team_members
     }
-    roles_map = {role.role: role.id for role in api.role.get_list()}
+    roles_map = {role.role: role.id for role in get_roles(api)}
 
     res_members: List[UserInfo] = []
+    members_changed = False
     for member in members_to_add:
         if member.login not in existing_team_members_names:
             user = api.user.get_info_by_login(member.login)
@@ -135,6 +149,7 @@ def get_or_create_members(
                 api.user.add_to_team_by_login(member.login, team.id, roles_map[member.role])
             except:
                 api.user.add_to_team_by_login(member.login, team.id, roles_map["annotator"])
+            members_changed = True
         else:
             user = api.user.get_info_by_login(member.login)
             if user.login == "admin":
@@ -144,7 +159,10 @@ def get_or_create_members(
                 api.user.change_team_role(
                     existing_members_map[member.login]["id"], team.id, roles_map[member.role]
                 )
+                members_changed = True
         res_members.append(user)
+    if members_changed:
+        cache.invalidate(api, "members", team.id)
 
     for member in res_members:
         if member.login == creator.login:
@@ -165,7 +183,7 @@ def get_or_create_dataset(
     foreign_dataset_id = job.dataset_id
 
     # get or create workspace
-    workspace = foreign_api.workspace.get_info_by_id(foreign_workspace_id)
+    workspace = get_workspace(foreign_api, foreign_workspace_id)
     res_workspace = api.workspace.get_info_by_name(team.id, workspace.name)
     if res_workspace is None:
         res_workspace = api.workspace.create(
@@ -173,8 +191,8 @@ def get_or_create_dataset(
         )
 
     # get or create project
-    project = foreign_api.project.get_info_by_id(foreign_project_id)
-    meta_json = foreign_api.project.get_meta(project.id)
+    project = get_project(foreign_api, foreign_project_id)
+    meta_json = get_project_meta(foreign_api, project.id)
     res_project = api.project.get_info_by_name(res_workspace.id, project.name)
     if res_project is None:
         res_project = api.project.create(
@@ -187,7 +205,7 @@ def get_or_create_dataset(
     meta = sly.ProjectMeta.from_json(meta_json)
 
     # get or create dataset
-    dataset = foreign_api.dataset.get_info_by_id(foreign_dataset_id)
+    dataset = get_dataset(foreign_api, foreign_dataset_id)
     res_dataset = api.dataset.get_info_by_name(res_project.id, dataset.name)
     if res_dataset is None:
         res_dataset = api.dataset.create(
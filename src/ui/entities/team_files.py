@@ -1,11 +1,156 @@
+import contextlib
 import os
-from typing import List
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+import requests
 import supervisely as sly
-from supervisely import batched
+from supervisely.api.module_api import ApiField
 from supervisely.app.widgets import Progress
 from supervisely.api.file_api import FileInfo
+from src.batch_size import AdaptiveBatchSize
+from src.journal import Journal
+from src.pipeline import ByteBudget, SharedProgress, limit_requests, run_pipeline
+from src.retry import is_server_error, retry_call
+from src.ui.entities.workspaces import FOREIGN_MAX_REQUESTS
+from src.cache import cache, get_team, get_team_by_name
 
 BATCH_SIZE = 50
+# upload batches are adjusted to measured latency, file sizes and errors
+upload_batch_size = AdaptiveBatchSize("team files upload", initial=BATCH_SIZE)
+# files are downloaded and uploaded at the same time, downloaded files waiting for upload
+# take at most TEAM_FILES_DISK_BUDGET bytes of local disk
+TEAM_FILES_DOWNLOAD_WORKERS = int(os.environ.get("TEAM_FILES_DOWNLOAD_WORKERS", 4))
+TEAM_FILES_UPLOAD_WORKERS = int(os.environ.get("TEAM_FILES_UPLOAD_WORKERS", 2))
+TEAM_FILES_DISK_BUDGET = int(os.environ.get("TEAM_FILES_DISK_BUDGET_MB", 4096)) * 1024 * 1024
+# files larger than LARGE_FILE_SIZE are downloaded as LARGE_FILE_CHUNK_SIZE byte ranges
+# by LARGE_FILE_WORKERS connections at once
+LARGE_FILE_SIZE = int(os.environ.get("LARGE_FILE_SIZE_MB", 512)) * 1024 * 1024
+LARGE_FILE_CHUNK_SIZE = int(os.environ.get("LARGE_FILE_CHUNK_SIZE_MB", 64)) * 1024 * 1024
+LARGE_FILE_WORKERS = int(os.environ.get("LARGE_FILE_WORKERS", 8))
+RANGE_READ_TIMEOUT = 60
+# instances that ignore Range header, large files are downloaded from them in one stream
+ranges_unsupported = set()
+
+
+def get_files_index(api: sly.Api, team_id: int) -> Dict[str, FileInfo]:
+    # one recursive listing of the team instead of a request per file, sizes and hashes
+    # of existing files are kept to compare them with incoming files
+    files: List[FileInfo] = api.file.list(team_id, "/", True, return_type="fileinfo")
+    return {file.path: file for file in files if not file.is_dir}
+
+
+def is_file_changed(file: FileInfo, existing_file: FileInfo) -> bool:
+    # sizes differ for changed and partially uploaded files, hashes catch changes of the same
+    # size, files without hashes are compared by modification time
+    if file.sizeb != existing_file.sizeb:
+        return True
+    if file.hash and existing_file.hash:
+        return file.hash != existing_file.hash
+    if file.updated_at and existing_file.updated_at:
+        return file.updated_at > existing_file.updated_at
+    return False
+
+
+class RangeNotSupported(Exception):
+    pass
+
+
+def download_range(
+    api: sly.Api, team_id: int, file: FileInfo, local_path: str, start: int, end: int
+) -> int:
+    # Writes bytes start..end of the file to the same offset of local_path. Response must be
+    # exactly the requested range, anything else would overwrite other ranges of the file.
+    # Server errors are retried, any other answer that is not the range (e.g. 200 with the
+    # whole file or 4xx to the Range header) means the file is downloaded without ranges.
+    # Request and reading of the body count as one request of the instance limit.
+    headers = dict(api.headers)
+    headers["Range"] = f"bytes={start}-{end}"
+    expected = end - start + 1
+    semaphore = getattr(api, "_requests_semaphore", None)
+    with semaphore if semaphore is not None else contextlib.nullcontext():
+        response = requests.post(
+            f"{api.server_address}/public/api/v3/file-storage.download",
+            json={ApiField.TEAM_ID: team_id, ApiField.PATH: file.path},
+            headers=headers,
+            stream=True,
+            timeout=RANGE_READ_TIMEOUT,
+        )
+        with response:
+            try:
+                response.raise_for_status()
+            except requests.exceptions.HTTPError as e:
+                if is_server_error(e):
+                    raise
+            content_range = response.headers.get("Content-Range", "")
+            is_range = content_range.startswith(f"bytes {start}-{end}/")
+            if response.status_code != 206 or not is_range:
+                raise RangeNotSupported(
+                    f"Unexpected response to range {start}-{end} of {file.path}: "
+                    f"{response.status_code} {content_range}"
+                )
+            written = 0
+            with open(local_path, "r+b") as f:
+                f.seek(start)
+                for chunk in response.iter_content(chunk_size=1024 * 1024):
+                    chunk = chunk[: expected - written]
+                    f.write(chunk)
+                    written += len(chunk)
+                    if written >= expected:
+                        break
+    if written != expected:
+        raise ConnectionError(f"Range {start}-{end} of {file.path} is incomplete")
+    return written
+
+
+def download_large_file(
+    api: sly.Api,
+    team_id: int,
+    file: FileInfo,
+    local_path: str,
+    progress_cb: Callable = None,
+) -> bool:
+    # Byte ranges of the file are downloaded concurrently and written to their offsets
+    # in a preallocated file. A failed range is requested again, the rest is kept.
+    # Returns False if the instance doesn't support ranged downloads.
+    if api.server_address in ranges_unsupported:
+        return False
+    size = file.sizeb
+    ranges = [
+        (start, min(start + LARGE_FILE_CHUNK_SIZE, size) - 1)
+        for start in range(0, size, LARGE_FILE_CHUNK_SIZE)
+    ]
+    sly.fs.ensure_base_path(local_path)
+    with open(local_path, "wb") as f:
+        if hasattr(os, "posix_fallocate"):
+            os.posix_fallocate(f.fileno(), 0, size)
+        else:
+            f.truncate(size)
+
+    def download_range_with_retry(byte_range):
+        start, end = byte_range
+        name = f"downloading {file.path} bytes {start}-{end}"
+        written = retry_call(
+            [api], name, download_range, api, team_id, file, local_path, start, end
+        )
+        if progress_cb is not None:
+            progress_cb(written)
+
+    try:
+        # the first range shows whether the instance supports ranged downloads at all
+        download_range_with_retry(ranges[0])
+        with ThreadPoolExecutor(max_workers=LARGE_FILE_WORKERS) as executor:
+            list(executor.map(download_range_with_retry, ranges[1:]))
+    except RangeNotSupported as e:
+        ranges_unsupported.add(api.server_address)
+        sly.logger.warn(
+            f"Ranged downloads are not supported by {api.server_address}. "
+            "Large files will be downloaded in one stream",
+            extra={"error": repr(e)},
+        )
+        return False
+    return True
 
 
 def import_team_files(
@@ -15,11 +160,15 @@ def import_team_files(
     remote_paths: List[str],
     progress_upload: Progress,
     progress_download: Progress,
+    journal: Journal = None,
+    files_collision: str = "ignore",
 ):
-    team = foreign_api.team.get_info_by_id(team_id)
-    res_team = api.team.get_info_by_name(team.name)
+    limit_requests(foreign_api, FOREIGN_MAX_REQUESTS)
+    team = get_team(foreign_api, team_id)
+    res_team = get_team_by_name(api, team.name)
     if res_team is None:
         res_team = api.team.create(team.name, description=team.description)
+        cache.put(api, "team_by_name", res_team.name, res_team)
 
     files_to_upload = []
     for remote_path in remote_paths:
@@ -30,52 +179,128 @@ def import_team_files(
         else:
             files_to_upload.append(file)
 
+    if journal is not None:
+        done_paths = journal.get_done("file")
+        files_to_upload = [file for file in files_to_upload if file.path not in done_paths]
+
+    # "ignore" skips every file that exists in destination team,
+    # "sync" copies files that are new or changed since the previous import
+    existing_files = get_files_index(api, res_team.id)
+    new_files, changed_files, skipped = [], [], []
+    for file in files_to_upload:
+        existing_file = existing_files.get(file.path)
+        if existing_file is None:
+            new_files.append(file)
+        elif files_collision == "sync" and is_file_changed(file, existing_file):
+            changed_files.append(file)
+        else:
+            skipped.append(file.path)
+    sly.logger.info(
+        f"Team Files: {len(new_files)} new, {len(changed_files)} changed, {len(skipped)} unchanged",
+        extra={
+            "new_bytes": sum([file.sizeb or 0 for file in new_files]),
+            "changed_bytes": sum([file.sizeb or 0 for file in changed_files]),
+            "changed": [file.path for file in changed_files[:10]],
+        },
+    )
+    if len(skipped) > 0:
+        sly.logger.warn(
+            f"{len(skipped)} files already exist in destination team. Skipping...",
+            extra={"paths": skipped[:10]},
+        )
+        skipped = set(skipped)
+        files_to_upload = [file for file in files_to_upload if file.path not in skipped]
+    replaced_paths = set([file.path for file in changed_files])
+
     storage_dir = "storage"
     sly.fs.mkdir(storage_dir)
-    local_paths = []
-    remote_paths = []
-    with progress_upload(
-        message="Downloading Team Files", total=len(files_to_upload)
-    ) as pbar_download_total:
-        for batch_files in batched(files_to_upload):
-            for file in batch_files:
-                file: FileInfo
-                with progress_download(
-                    message=f"Downloading {file.name}",
-                    total=file.sizeb,
-                    unit="iB",
-                    unit_scale=True,
-                ) as pbar_download:
-                    progress_download.show()
-                    remote_path = file.path
-                    local_path = os.path.join(storage_dir, remote_path.lstrip("/"))
-
-                    if api.file.exists(res_team.id, file.path):
-                        sly.logger.warn(f'File: "{file.path}" already exists')
-                        pbar_download.update(file.sizeb)
-                        pbar_download_total.update()
-                        continue
+    sizes = [file.sizeb or 0 for file in files_to_upload]
+    # staged files are counted until their upload is finished, at least one upload batch
+    # must fit into the budget
+    disk_budget = ByteBudget(max(TEAM_FILES_DISK_BUDGET, upload_batch_size.max_batch_bytes))
+    stop = threading.Event()
+    download_executor = ThreadPoolExecutor(max_workers=TEAM_FILES_DOWNLOAD_WORKERS)
+    upload_executor = ThreadPoolExecutor(max_workers=TEAM_FILES_UPLOAD_WORKERS)
+
+    # Batches of files are downloaded by a pool of workers and every downloaded batch
+    # is uploaded in background while the next one is being downloaded. Staged files
+    # are removed right after their batch is uploaded.
+    with progress_download(
+        message="Downloading Team Files", total=sum(sizes), unit="iB", unit_scale=True
+    ) as pbar_download, progress_upload(
+        message="Uploading Team Files", total=len(files_to_upload)
+    ) as pbar_upload:
+        progress_download.show()
+        pbar_download = SharedProgress(pbar_download)
+        pbar_upload = SharedProgress(pbar_upload)
 
+        def download_file(file: FileInfo) -> str:
+            if not disk_budget.acquire(file.sizeb or 0, stop):
+                return None
+            local_path = os.path.join(storage_dir, file.path.lstrip("/"))
+            try:
+                is_downloaded = False
+                if (file.sizeb or 0) > LARGE_FILE_SIZE:
+                    is_downloaded = download_large_file(
+                        foreign_api, team_id, file, local_path, pbar_download.update
+                    )
+                if not is_downloaded:
                     foreign_api.file.download(
                         team_id=team_id,
-                        remote_path=remote_path,
+                        remote_path=file.path,
                         local_save_path=local_path,
                         progress_cb=pbar_download.update,
                     )
-                    local_paths.append(local_path), remote_paths.append(remote_path)
-                pbar_download_total.update()
-            progress_download.hide()
-
-    with progress_upload(message="Uploading Team Files", total=len(local_paths)) as pbar_upload:
-        if len(local_paths) == 0:
-            pbar_upload.update(len(local_paths))
-            return
-        for local_paths_batch, remote_paths_batch in zip(
-            batched(local_paths, BATCH_SIZE), batched(remote_paths, BATCH_SIZE)
-        ):
-            api.file.upload_bulk(
-                team_id=res_team.id, src_paths=local_paths_batch, dst_paths=remote_paths_batch
+            except Exception:
+                sly.fs.silent_remove(local_path)
+                disk_budget.release(file.sizeb or 0)
+                raise
+            return local_path
+
+        def download_batch(batch: List[FileInfo]) -> List[str]:
+            return list(download_executor.map(download_file, batch))
+
+        def upload_batch(batch: List[FileInfo], local_paths: List[str]):
+            remote_paths_batch = [file.path for file in batch]
+            nbytes = sum([file.sizeb or 0 for file in batch])
+            start = time.monotonic()
+            try:
+                for remote_path in remote_paths_batch:
+                    if remote_path in replaced_paths:
+                        # outdated copy is removed right before the new one is uploaded
+                        api.file.remove(res_team.id, remote_path)
+                api.file.upload_bulk(
+                    team_id=res_team.id, src_paths=local_paths, dst_paths=remote_paths_batch
+                )
+            except Exception:
+                upload_batch_size.record(len(batch), time.monotonic() - start, nbytes, error=True)
+                raise
+            finally:
+                for local_path in local_paths:
+                    sly.fs.silent_remove(local_path)
+                disk_budget.release(nbytes)
+            upload_batch_size.record(len(batch), time.monotonic() - start, nbytes)
+            if journal is not None:
+                journal.mark_done("file", remote_paths_batch)
+            pbar_upload.update(len(batch))
+
+        uploads = []
+
+        def start_upload(batch: List[FileInfo], local_paths: List[str]):
+            uploads.append(upload_executor.submit(upload_batch, batch, local_paths))
+            # fail fast if one of the previous uploads failed
+            for future in [future for future in uploads if future.done()]:
+                uploads.remove(future)
+                future.result()
+
+        with download_executor, upload_executor:
+            run_pipeline(
+                upload_batch_size.batches(files_to_upload, sizes),
+                download_batch,
+                start_upload,
+                queue_depth=2,
+                stop=stop,
             )
-            pbar_upload.update(len(local_paths_batch))
-            for p in local_paths_batch:
-                sly.fs.silent_remove(p)
+            for future in uploads:
+                future.result()
+        progress_download.hide()
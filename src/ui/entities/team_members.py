@@ -5,6 +5,8 @@ from supervisely.app.widgets import Progress
 from supervisely import TeamInfo
 from supervisely.api.user_api import UserInfo
 from supervisely.api.role_api import RoleInfo
+from src.journal import Journal
+from src.cache import cache, get_roles, get_team, get_team_by_name, get_team_members
 
 # Disabled users will be skipped
 # Restricted users will be unrestricted
@@ -18,13 +20,15 @@ def import_team_members(
     default_password: str,
     progress: Progress,
     ignore_collision: bool,
+    journal: Journal = None,
 ):
-    foreign_team: TeamInfo = foreign_api.team.get_info_by_id(team_id)
-    res_team: TeamInfo = api.team.get_info_by_name(foreign_team.name)
+    foreign_team: TeamInfo = get_team(foreign_api, team_id)
+    res_team: TeamInfo = get_team_by_name(api, foreign_team.name)
     if res_team is None:
         res_team = api.team.create(name=foreign_team.name, description=foreign_team.description)
+        cache.put(api, "team_by_name", res_team.name, res_team)
 
-    existing_members: List[UserInfo] = api.user.get_team_members(team_id=res_team.id)
+    existing_members: List[UserInfo] = get_team_members(api, res_team.id)
     existing_members_map = {
         member.login: {"id": member.id, "role": member.role} for member in existing_members
     }
@@ -37,26 +41,38 @@ def import_team_members(
     incoming_users_names = members_collapse.get_transferred_items()
     incoming_users = [
         user
-        for user in foreign_api.user.get_team_members(team_id)
+        for user in get_team_members(foreign_api, team_id)
         if user.login in incoming_users_names
     ]
 
-    roles_map = {role.role: role.id for role in api.role.get_list()}
+    roles_map = {role.role: role.id for role in get_roles(api)}
     incoming_members = sorted(incoming_users, key=lambda user_info: user_info.role)
     with progress(
         message=f"Import team members from {foreign_team.name}", total=len(incoming_members)
     ) as pbar:
-        for incoming_member in incoming_members:
-            add_member_to_team(
-                api=api,
-                team=res_team,
-                member=incoming_member,
-                default_password=default_password,
-                existing_members_map=existing_members_map,
-                roles_map=roles_map,
-                ignore_collision=ignore_collision,
-                pbar=pbar,
-            )
+        done_logins = set()
+        if journal is not None:
+            done_logins = journal.get_done("member")
+        try:
+            for incoming_member in incoming_members:
+                if incoming_member.login in done_logins:
+                    pbar.update()
+                    continue
+                add_member_to_team(
+                    api=api,
+                    team=res_team,
+                    member=incoming_member,
+                    default_password=default_password,
+                    existing_members_map=existing_members_map,
+                    roles_map=roles_map,
+                    ignore_collision=ignore_collision,
+                    pbar=pbar,
+                )
+                if journal is not None:
+                    journal.mark_done("member", [incoming_member.login])
+        finally:
+            # members and their roles were changed
+            cache.invalidate(api, "members", res_team.id)
 
 
 def add_member_to_team(
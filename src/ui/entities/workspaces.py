@@ -1,7 +1,11 @@
-import anyio
+import io
+import json
 import os
+import queue
 import time
-from typing import List
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from typing import Callable, Dict, List, Set
 import supervisely as sly
 from urllib.parse import urlparse
 from supervisely import batched, KeyIdMap, DatasetInfo
@@ -12,9 +16,96 @@ from supervisely.api.image_api import ImageInfo
 from supervisely.api.video.video_api import VideoInfo
 from supervisely.api.volume.volume_api import VolumeInfo
 from supervisely.api.pointcloud.pointcloud_api import PointcloudInfo
+from supervisely.pointcloud_annotation.pointcloud_episode_frame_collection import (
+    PointcloudEpisodeFrameCollection,
+)
+from supervisely.pointcloud_annotation.pointcloud_episode_object_collection import (
+    PointcloudEpisodeObjectCollection,
+)
 from supervisely.io.fs import mkdir, silent_remove
+from supervisely._utils import get_bytes_hash
+from src.batch_size import AdaptiveBatchSize
+from src.journal import Journal
+from src.pipeline import (
+    ByteBudget,
+    ChunkedStream,
+    SharedProgress,
+    limit_requests,
+    run_pipeline,
+)
+from src.retry import retry_call, retry_items
+from src.cache import (
+    cache,
+    get_datasets,
+    get_project,
+    get_project_meta,
+    get_projects,
+    get_team,
+    get_team_by_name,
+    get_workspace,
+    get_workspaces,
+)
 
 BATCH_SIZE = 50
+# number of fetched image batches that can wait for upload
+QUEUE_DEPTH = int(os.environ.get("QUEUE_DEPTH", 4))
+
+# transfer lanes of images, from the cheapest to the most expensive one:
+# same - identical image and annotation exist in destination, nothing is copied
+# existing - image exists in destination, only annotation is copied
+LANE_SAME = "same"
+LANE_EXISTING = "existing"
+LANE_LINK = "link"
+LANE_HASH = "hash"
+LANE_BYTES = "bytes"
+LANES = [LANE_SAME, LANE_EXISTING, LANE_LINK, LANE_HASH, LANE_BYTES]
+# items registered by hash don't carry binaries, so they are sent in larger groups
+HASH_BATCH_SIZE = 500
+HASH_CHECK_BATCH_SIZE = 10000
+
+# images up to STREAM_MAX_ITEM_SIZE are passed to the destination through memory,
+# all image pipelines together hold at most STREAM_MEMORY_BUDGET bytes
+STREAM_MAX_ITEM_SIZE = int(os.environ.get("STREAM_MAX_ITEM_SIZE_MB", 16)) * 1024 * 1024
+STREAM_MEMORY_BUDGET = int(os.environ.get("STREAM_MEMORY_BUDGET_MB", 1024)) * 1024 * 1024
+memory_budget = ByteBudget(STREAM_MEMORY_BUDGET)
+
+# annotations are uploaded in groups limited by JSON payload size rather than by count
+ANN_BATCH_BYTES = int(os.environ.get("ANN_BATCH_SIZE_MB", 8)) * 1024 * 1024
+ANN_BATCH_MAX_ITEMS = 500
+
+# batch sizes of the transfer lanes are adjusted to measured latency, bytes and errors,
+# BATCH_SIZE and HASH_BATCH_SIZE are the initial values
+lane_batch_sizes = {
+    LANE_LINK: AdaptiveBatchSize("image links", initial=BATCH_SIZE),
+    LANE_HASH: AdaptiveBatchSize("image hashes", initial=HASH_BATCH_SIZE, max_size=2000),
+    LANE_BYTES: AdaptiveBatchSize("image binaries", initial=BATCH_SIZE),
+}
+
+# videos of a dataset transferred at the same time, every worker holds one chunk in memory
+VIDEO_MAX_WORKERS = int(os.environ.get("VIDEO_MAX_WORKERS", 4))
+VIDEO_CHUNK_SIZE = int(os.environ.get("VIDEO_CHUNK_SIZE_MB", 8)) * 1024 * 1024
+
+# annotations of videos, volumes and point clouds are downloaded for this many items at once
+ENTITY_ANN_BATCH_SIZE = int(os.environ.get("ENTITY_ANN_BATCH_SIZE", BATCH_SIZE))
+
+# meshes of volume spatial figures are downloaded MESH_BATCH_SIZE figures per request,
+# MESH_MAX_WORKERS volumes of a dataset transfer their meshes at the same time
+MESH_BATCH_SIZE = int(os.environ.get("MESH_BATCH_SIZE", 10))
+MESH_MAX_WORKERS = int(os.environ.get("MESH_MAX_WORKERS", 4))
+
+# related images of point clouds are attached RELATED_IMAGES_BATCH_SIZE images per request
+RELATED_IMAGES_BATCH_SIZE = int(os.environ.get("RELATED_IMAGES_BATCH_SIZE", 500))
+
+# frames of point cloud episodes are copied by EPISODE_MAX_WORKERS workers and their
+# annotations are uploaded in chunks of EPISODE_FRAMES_CHUNK frames
+EPISODE_FRAMES_CHUNK = int(os.environ.get("EPISODE_FRAMES_CHUNK", 100))
+EPISODE_MAX_WORKERS = int(os.environ.get("EPISODE_MAX_WORKERS", 4))
+
+# number of projects and datasets processed at the same time
+MAX_WORKERS = int(os.environ.get("MAX_WORKERS", 4))
+# number of requests sent to each instance at the same time by all workers
+FOREIGN_MAX_REQUESTS = int(os.environ.get("FOREIGN_MAX_REQUESTS", 16))
+DESTINATION_MAX_REQUESTS = int(os.environ.get("DESTINATION_MAX_REQUESTS", 16))
 
 
 def change_link(bucket_path: str, link: str):
@@ -22,24 +113,89 @@ def change_link(bucket_path: str, link: str):
     return f"{bucket_path}{parsed_url.path}"
 
 
-def retyr_if_end_stream(func):
-    # decorator to retry 5 times function if it raises EndOfStream exception
-    def wrapper(*args, **kwargs):
-        for i in range(5):
-            try:
-                return func(*args, **kwargs)
-            except (anyio.EndOfStream, FileNotFoundError) as e:
-                if i == 4:
-                    raise e
-                sly.logger.warn(f"Error occurred while downloading/uploading images. Retrying... {i + 1}/5")
-                time.sleep(2)
-    
-    return wrapper
-            
-
-
-@retyr_if_end_stream
-def download_upload_images(
+def download_images(
+    foreign_api: sly.Api,
+    dataset: DatasetInfo,
+    images_ids: List[int],
+    images_paths: List[str],
+):
+    for p in images_paths:
+        silent_remove(p)
+    # files are written only when fully received, downloaded ones are not requested again
+    retry_items(
+        lambda items: foreign_api.image.download_paths(
+            dataset_id=dataset.id,
+            ids=[id for id, _ in items],
+            paths=[path for _, path in items],
+        ),
+        list(zip(images_ids, images_paths)),
+        [foreign_api],
+        is_done=lambda item: os.path.isfile(item[1]),
+        name="images download",
+    )
+
+
+def download_images_bytes(
+    foreign_api: sly.Api,
+    dataset: DatasetInfo,
+    images_ids: List[int],
+) -> Dict[int, bytes]:
+    images_bytes = retry_items(
+        lambda ids: foreign_api.image.download_bytes(dataset_id=dataset.id, ids=ids),
+        images_ids,
+        [foreign_api],
+        name="images download",
+    )
+    return {id: data for id, data in zip(images_ids, images_bytes)}
+
+
+def upload_images_bytes(
+    api: sly.Api,
+    res_dataset: DatasetInfo,
+    images_names: List[str],
+    images_bytes: List[bytes],
+    images_metas: List[dict],
+):
+    def upload(items):
+        hashes = [get_bytes_hash(data) for _, data, _ in items]
+        api.image._upload_data_bulk(
+            lambda data: io.BytesIO(data), zip([data for _, data, _ in items], hashes)
+        )
+        return api.image.upload_hashes(
+            dataset_id=res_dataset.id,
+            names=[name for name, _, _ in items],
+            hashes=hashes,
+            metas=[meta for _, _, meta in items],
+        )
+
+    return retry_items(
+        upload,
+        list(zip(images_names, images_bytes, images_metas)),
+        [api],
+        find_done=find_created(api.image, res_dataset, lambda item: item[0]),
+        name="images upload",
+    )
+
+
+def batched_by_size(items: List, sizes: List[int], max_size: int, max_count: int):
+    # split items into consecutive batches with total size up to max_size, an item
+    # that is larger than max_size goes to a batch of its own
+    batch, batch_size = [], 0
+    for item, size in zip(items, sizes):
+        if len(batch) > 0 and (batch_size + size > max_size or len(batch) >= max_count):
+            yield batch
+            batch, batch_size = [], 0
+        batch.append(item)
+        batch_size += size
+    if len(batch) > 0:
+        yield batch
+
+
+def is_streamable(image: ImageInfo):
+    return image.size is not None and image.size <= STREAM_MAX_ITEM_SIZE
+
+
+def upload_images(
     foreign_api: sly.Api,
     api: sly.Api,
     dataset: DatasetInfo,
@@ -49,52 +205,54 @@ def download_upload_images(
     images_names: List[str],
     images_metas: List[dict],
     images_hashs: List[str],
-    existing_images: List[str],
-):  
-    for p in images_paths:
-        silent_remove(p)
+):
+    # only items of the failed part of the batch are transferred again
+    return retry_items(
+        lambda items: _upload_images(
+            foreign_api, api, dataset, res_dataset, *[list(column) for column in zip(*items)]
+        ),
+        list(zip(images_ids, images_paths, images_names, images_metas, images_hashs)),
+        [foreign_api, api],
+        find_done=find_created(api.image, res_dataset, lambda item: item[2]),
+        name="images upload",
+    )
 
-    res_images = []
-    if all([name in existing_images for name in images_names]):
-        sly.logger.info("Current batch of images already exist in destination dataset. Skipping...")
-        return [existing_images[name] for name in images_names]
-    elif any([name in existing_images for name in images_names]):
-        sly.logger.info("Some images in batch already exist in destination dataset. Downloading only missing images.")
-        for id, path, name, meta in zip(images_ids, images_paths, images_names, images_metas):
-            if name in existing_images:
-                img = existing_images[name]
-                res_images.append(img)
-            else:
-                foreign_api.image.download_path(id, path)
-                img = api.image.upload_path(
-                    dataset_id=res_dataset.id,
-                    name=name,
-                    path=path,
-                    meta=meta,
-                )
-                silent_remove(path)
-                res_images.append(img)
+
+def _upload_images(
+    foreign_api: sly.Api,
+    api: sly.Api,
+    dataset: DatasetInfo,
+    res_dataset: DatasetInfo,
+    images_ids: List[int],
+    images_paths: List[str],
+    images_names: List[str],
+    images_metas: List[dict],
+    images_hashs: List[str],
+):
     if all([hash is not None for hash in images_hashs]):
         try:
             sly.logger.info("Attempting to upload images by hash.")
-            valid_hashes = api.image.check_existing_hashes(images_hashs)
-            if len(valid_hashes) != len(images_hashs):
+            valid_hashes = api.image.check_existing_hashes(list(set(images_hashs)))
+            if len(valid_hashes) != len(set(images_hashs)):
                 raise Exception("Some hashes are not valid.")
-            res_images = api.image.upload_hashes(
+            return api.image.upload_hashes(
                 dataset_id=res_dataset.id,
                 names=images_names,
                 hashes=images_hashs,
                 metas=images_metas,
             )
-            return res_images
         except Exception as e:
             sly.logger.info(f"Failed uploading images by hash. Attempting to upload images with paths.")
 
-    foreign_api.image.download_paths(
-        dataset_id=dataset.id,
-        ids=images_ids,
-        paths=images_paths,
-    )
+    not_downloaded = [
+        (id, path) for id, path in zip(images_ids, images_paths) if not os.path.isfile(path)
+    ]
+    if len(not_downloaded) > 0:
+        foreign_api.image.download_paths(
+            dataset_id=dataset.id,
+            ids=[id for id, _ in not_downloaded],
+            paths=[path for _, path in not_downloaded],
+        )
     res_images = api.image.upload_paths(
         dataset_id=res_dataset.id,
         names=images_names,
@@ -106,6 +264,311 @@ def download_upload_images(
     return res_images
 
 
+def check_existing_hashes(
+    api: sly.Api, hashes: List[str], hashes_cache: Dict[str, bool] = None, entity_api=None
+) -> Set[str]:
+    # check hashes in destination instance in a few large calls, hashes that are already
+    # known (e.g. from other datasets of the same project) are not requested again
+    if hashes_cache is None:
+        hashes_cache = {}
+    if entity_api is None:
+        entity_api = api.image
+    unknown = list(set([hash for hash in hashes if hash not in hashes_cache]))
+    for hashes_batch in batched(unknown, HASH_CHECK_BATCH_SIZE):
+        try:
+            valid_hashes = set(entity_api.check_existing_hashes(hashes_batch))
+        except Exception:
+            sly.logger.info("Failed checking items hashes. Items will be downloaded.")
+            continue
+        for hash in hashes_batch:
+            hashes_cache[hash] = hash in valid_hashes
+    return set([hash for hash in hashes if hashes_cache.get(hash, False)])
+
+
+def register_items(
+    items: List,
+    upload_bulk: Callable[[List], List],
+    upload_one: Callable,
+    batch_size: int = BATCH_SIZE,
+    find_done: Callable[[List], List] = None,
+) -> Dict[int, object]:
+    # Registers items in destination by hash or link with one bulk call per batch. If the
+    # bulk call is rejected, items of the batch are registered one by one, so only items
+    # rejected by the server are left for binary transfer. Items that the failed bulk call
+    # managed to create are found by find_done and are not registered again.
+    # Returns map of item id to info.
+    registered = {}
+    for batch in batched(items, batch_size):
+        try:
+            res_infos = upload_bulk(batch)
+        except Exception:
+            sly.logger.info("Failed registering items in bulk. Registering them one by one.")
+            res_infos = [None] * len(batch)
+            if find_done is not None:
+                res_infos = find_done(batch)
+            for i, item in enumerate(batch):
+                if res_infos[i] is not None:
+                    continue
+                try:
+                    res_infos[i] = upload_one(item)
+                except Exception:
+                    pass
+        for item, res_info in zip(batch, res_infos):
+            if res_info is not None:
+                registered[item.id] = res_info
+    return registered
+
+
+def get_existing_items(entity_api, res_dataset: DatasetInfo, items: List) -> Dict[int, object]:
+    # Items created in destination dataset by the import before the restart, they are reused
+    # instead of being registered again under the same name. Returns map of item id to info.
+    existing = {res_item.name: res_item for res_item in entity_api.get_list(res_dataset.id)}
+    return {item.id: existing[item.name] for item in items if item.name in existing}
+
+
+def find_created(entity_api, res_dataset: DatasetInfo, get_name: Callable = None) -> Callable:
+    # A create call that failed with a timeout or a server error may still have created some
+    # of the items. Before the call is repeated, infos of such items are taken from destination
+    # dataset by name (None for items that don't exist), so they aren't created twice.
+    if get_name is None:
+        get_name = lambda item: item.name
+
+    def find(items: List) -> List:
+        existing = {res_item.name: res_item for res_item in entity_api.get_list(res_dataset.id)}
+        return [existing.get(get_name(item)) for item in items]
+
+    return find
+
+
+class AnnotationsStage:
+    # Copies annotations of videos, volumes and point clouds in background while items are
+    # being transferred. Transferred items are collected into batches, annotations of a batch
+    # are downloaded with one request while the previous batch is converted and uploaded.
+    # At most max_in_flight batches wait in the stage, put() blocks when annotations fall
+    # behind, so the memory held by the stage stays bounded.
+
+    def __init__(
+        self,
+        foreign_api: sly.Api,
+        dataset: DatasetInfo,
+        annotation_api,
+        upload_annotation: Callable,
+        batch_size: int = ENTITY_ANN_BATCH_SIZE,
+        max_in_flight: int = QUEUE_DEPTH,
+    ):
+        self._foreign_api = foreign_api
+        self._dataset = dataset
+        self._annotation_api = annotation_api
+        self._upload_annotation = upload_annotation
+        self._batch_size = batch_size
+        self._max_in_flight = max_in_flight
+        self._queue = queue.Queue(maxsize=max(1, max_in_flight))
+        self._batch = []
+        self._stop = threading.Event()
+        self._errors = []
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self._enqueue(self._batch)
+        else:
+            self._stop.set()
+        self._batch = []
+        self._enqueue(None)
+        self._thread.join()
+        if exc_type is None:
+            self._raise_if_failed()
+        return False
+
+    def put(self, item, res_item):
+        self._raise_if_failed()
+        self._batch.append((item, res_item))
+        if len(self._batch) >= self._batch_size:
+            self._enqueue(self._batch)
+            self._batch = []
+
+    def _raise_if_failed(self):
+        if len(self._errors) > 0:
+            raise self._errors[0]
+
+    def _enqueue(self, batch):
+        if batch is not None and len(batch) == 0:
+            return
+        while self._thread.is_alive():
+            try:
+                self._queue.put(batch, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+        self._raise_if_failed()
+
+    def _run(self):
+        try:
+            run_pipeline(
+                iter(self._queue.get, None),
+                self._download,
+                self._upload,
+                self._max_in_flight,
+                self._stop,
+            )
+        except Exception as e:
+            self._errors.append(e)
+
+    def _download(self, batch):
+        return retry_items(
+            lambda ids: self._annotation_api.download_bulk(self._dataset.id, ids),
+            [item.id for item, _ in batch],
+            [self._foreign_api],
+            name="annotations download",
+        )
+
+    def _upload(self, batch, ann_jsons):
+        for (item, res_item), ann_json in zip(batch, ann_jsons):
+            self._upload_annotation(item, res_item, ann_json)
+
+
+def list_related_images(foreign_api: sly.Api, dataset: DatasetInfo) -> Dict[int, List[dict]]:
+    # related images of all point clouds of the dataset in a few paginated requests,
+    # grouped by point cloud id
+    images = foreign_api.pointcloud.get_list_all_pages(
+        "point-clouds.images.list",
+        {ApiField.DATASET_ID: dataset.id},
+        convert_json_info_cb=lambda x: x,
+    )
+    related_images = {}
+    for image in images:
+        related_images.setdefault(image[ApiField.ENTITY_ID], []).append(image)
+    return related_images
+
+
+def transfer_related_images(
+    api: sly.Api,
+    foreign_api: sly.Api,
+    dataset: DatasetInfo,
+    related_images: Dict[int, List[dict]],
+    hashes_cache: Dict[str, bool] = None,
+):
+    # make binaries of related images available in destination: hashes are checked in one
+    # pass and only images missing in destination are downloaded and uploaded
+    images = [image for entity_images in related_images.values() for image in entity_images]
+    existing_hashes = check_existing_hashes(
+        api, [image[ApiField.HASH] for image in images], hashes_cache, api.pointcloud
+    )
+    missing = {}
+    for image in images:
+        if image[ApiField.HASH] not in existing_hashes:
+            missing.setdefault(image[ApiField.HASH], []).append(image)
+    if len(missing) == 0:
+        return
+    sly.logger.info(f"Transferring {len(missing)} related images of dataset: {dataset.name}")
+    storage_dir = os.path.join("storage", str(dataset.id), "related_images")
+    mkdir(storage_dir, True)
+    for hashes in batched(list(missing.keys())):
+        hash_images = [missing[hash][0] for hash in hashes]
+        paths = [
+            os.path.join(storage_dir, f"{image[ApiField.ID]}_{image[ApiField.NAME]}")
+            for image in hash_images
+        ]
+        for image, path in zip(hash_images, paths):
+            retry_call(
+                [foreign_api],
+                "related images download",
+                foreign_api.pointcloud.download_related_image,
+                image[ApiField.ID],
+                path,
+            )
+        new_hashes = retry_call(
+            [api], "related images upload", api.pointcloud.upload_related_images, paths
+        )
+        for hash, new_hash in zip(hashes, new_hashes):
+            for image in missing[hash]:
+                image[ApiField.HASH] = new_hash
+            if hashes_cache is not None:
+                hashes_cache[new_hash] = True
+        for path in paths:
+            silent_remove(path)
+
+
+def get_related_images_infos(images: List[dict], res_entity_id: int) -> List[dict]:
+    return [
+        {
+            ApiField.ENTITY_ID: res_entity_id,
+            ApiField.NAME: image[ApiField.NAME],
+            ApiField.HASH: image[ApiField.HASH],
+            ApiField.META: image[ApiField.META],
+        }
+        for image in images
+    ]
+
+
+def add_related_images(entity_api, infos: List[dict]):
+    for batch in batched(infos, RELATED_IMAGES_BATCH_SIZE):
+        entity_api.add_related_images(batch)
+
+
+def is_binary_changed(image: ImageInfo, res_image: ImageInfo) -> bool:
+    return image.hash is not None and res_image.hash is not None and image.hash != res_image.hash
+
+
+def is_annotation_outdated(image: ImageInfo, res_image: ImageInfo) -> bool:
+    # Only fields of image infos are compared, annotations themselves are not downloaded.
+    # Image may be uploaded while its annotation was not (e.g. the import failed between
+    # the stages), such destination image has other labels and tags than the original one.
+    # Otherwise annotation changes update image's updated_at, destination image is updated
+    # when annotation is copied, so the copy is outdated if original was changed after it.
+    if image.labels_count != res_image.labels_count:
+        return True
+    if len(image.tags or []) != len(res_image.tags or []):
+        return True
+    if image.updated_at is None or res_image.updated_at is None:
+        return True
+    return image.updated_at > res_image.updated_at
+
+
+def plan_images(
+    api: sly.Api,
+    images: List[ImageInfo],
+    existing_images: Dict[str, ImageInfo],
+    is_fast_mode: bool = False,
+    hashes_cache: Dict[str, bool] = None,
+    done_ids: Set[str] = None,
+) -> Dict[str, List[ImageInfo]]:
+    # sort every image of the dataset into the cheapest transfer lane, once per dataset
+    plan = {lane: [] for lane in LANES}
+    candidates = []
+    for image in images:
+        res_image = existing_images.get(image.name)
+        if done_ids is not None and str(image.id) in done_ids:
+            plan[LANE_SAME].append(image)
+        elif res_image is not None:
+            if is_binary_changed(image, res_image) or is_annotation_outdated(image, res_image):
+                plan[LANE_EXISTING].append(image)
+            else:
+                plan[LANE_SAME].append(image)
+        elif is_fast_mode and image.link is not None:
+            plan[LANE_LINK].append(image)
+        else:
+            candidates.append(image)
+
+    hashes = [image.hash for image in candidates if image.hash is not None]
+    valid_hashes = check_existing_hashes(api, hashes, hashes_cache)
+    for image in candidates:
+        if image.hash is not None and image.hash in valid_hashes:
+            plan[LANE_HASH].append(image)
+        else:
+            plan[LANE_BYTES].append(image)
+
+    sly.logger.info(
+        "Images transfer plan: "
+        + ", ".join([f"{lane}: {len(lane_images)}" for lane, lane_images in plan.items()])
+    )
+    return plan
+
+
 def process_images(
     api: sly.Api,
     foreign_api: sly.Api,
@@ -116,35 +579,171 @@ def process_images(
     is_fast_mode: bool = False,
     need_change_link: bool = False,
     bucket_path: str = None,
+    hashes_cache: Dict[str, bool] = None,
+    journal: Journal = None,
+    queue_depth: int = QUEUE_DEPTH,
 ):
-    storage_dir = "storage"
+    storage_dir = os.path.join("storage", str(dataset.id))
     mkdir(storage_dir, True)
     images: List[ImageInfo] = foreign_api.image.get_list(dataset.id)
     existing_images_list = api.image.get_list(res_dataset.id)
     existing_images = {}
     for img in existing_images_list:
         existing_images[img.name] = img
-    
+
+    # images copied before the session restart
+    done_ids = None
+    if journal is not None:
+        done_ids = journal.get_done("image", parent=dataset.id)
+
+    # destination images are never removed, images with the same name but other content
+    # are kept and only their annotations are copied
+    changed = [
+        image
+        for image in images
+        if image.name in existing_images
+        and is_binary_changed(image, existing_images[image.name])
+        and (done_ids is None or str(image.id) not in done_ids)
+    ]
+    if len(changed) > 0:
+        sly.logger.warn(
+            f"{len(changed)} images in dataset {res_dataset.name} differ from original ones. "
+            "Destination images are kept, only annotations will be copied."
+        )
+
+    if hashes_cache is None:
+        hashes_cache = {}
+    plan = plan_images(api, images, existing_images, is_fast_mode, hashes_cache, done_ids)
+
+    def lane_batches():
+        for lane in LANES:
+            lane_images = plan[lane]
+            if lane == LANE_SAME:
+                continue
+            if lane == LANE_EXISTING:
+                batches = batched(lane_images, HASH_BATCH_SIZE)
+            elif lane == LANE_BYTES:
+                sizes = [image.size for image in lane_images]
+                batches = lane_batch_sizes[lane].batches(lane_images, sizes)
+            else:
+                batches = lane_batch_sizes[lane].batches(lane_images)
+            for images_batch in batches:
+                yield lane, images_batch
+
+    stop = threading.Event()
+    # memory reserved for fetched batches (by the first image id) until they are uploaded
+    reserved = {}
+
+    # Binaries of the batch are fetched in background while previous batches are being
+    # uploaded to the destination instance.
+    def fetch_batch(lane_batch):
+        lane, images_batch = lane_batch
+        images_bytes = {}
+        if lane == LANE_BYTES:
+            in_memory = [image for image in images_batch if is_streamable(image)]
+            on_disk = [image for image in images_batch if not is_streamable(image)]
+            start = time.monotonic()
+            try:
+                if len(in_memory) > 0:
+                    size = sum([image.size for image in in_memory])
+                    if not memory_budget.acquire(size, stop):
+                        raise RuntimeError("Images import has been stopped")
+                    reserved[images_batch[0].id] = size
+                    start = time.monotonic()
+                    images_bytes = download_images_bytes(
+                        foreign_api, dataset, [image.id for image in in_memory]
+                    )
+                if len(on_disk) > 0:
+                    download_images(
+                        foreign_api,
+                        dataset,
+                        [image.id for image in on_disk],
+                        [os.path.join(storage_dir, image.name) for image in on_disk],
+                    )
+            except Exception:
+                lane_batch_sizes[lane].record(len(images_batch), time.monotonic() - start, error=True)
+                raise
+            nbytes = sum([image.size or 0 for image in images_batch])
+            lane_batch_sizes[lane].record(len(images_batch), time.monotonic() - start, nbytes)
+        return images_bytes
+
     with progress_items(
         message=f"Importing images from dataset: {dataset.name}", total=len(images)
     ) as pbar:
-        for images_batch in batched(images, BATCH_SIZE):
+        if len(plan[LANE_SAME]) > 0:
+            sly.logger.info(f"{len(plan[LANE_SAME])} images are the same in destination. Skipping...")
+            pbar.update(len(plan[LANE_SAME]))
+        # Annotations are copied by their own stage running along with the binary transfer:
+        # uploaded batches are queued as pairs of foreign and destination ids, annotations
+        # are downloaded in background and uploaded in groups limited by JSON size.
+        annotations_queue = queue.Queue()
+        annotations_stop = threading.Event()
+        annotations_errors = []
+
+        def download_annotations(ids_pair):
+            images_ids, _ = ids_pair
+            return retry_items(
+                lambda ids: foreign_api.annotation.download_json_batch(
+                    dataset_id=dataset.id,
+                    image_ids=ids,
+                    force_metadata_for_links=False,
+                ),
+                images_ids,
+                [foreign_api],
+                name="annotations download",
+            )
+
+        def upload_annotations(ids_pair, annotations):
+            images_ids, res_images_ids = ids_pair
+            sizes = [len(json.dumps(ann)) for ann in annotations]
+            items = list(zip(images_ids, res_images_ids, annotations))
+            for batch in batched_by_size(items, sizes, ANN_BATCH_BYTES, ANN_BATCH_MAX_ITEMS):
+                retry_items(
+                    lambda items: api.annotation.upload_jsons(
+                        img_ids=[id for _, id, _ in items], ann_jsons=[ann for _, _, ann in items]
+                    ),
+                    batch,
+                    [api],
+                    name="annotations upload",
+                )
+                if journal is not None:
+                    journal.mark_done("image", [id for id, _, _ in batch], parent=dataset.id)
+                pbar.update(len(batch))
+
+        def annotations_stage():
+            try:
+                run_pipeline(
+                    iter(annotations_queue.get, None),
+                    download_annotations,
+                    upload_annotations,
+                    queue_depth,
+                    annotations_stop,
+                )
+            except Exception as e:
+                annotations_errors.append(e)
+
+        annotations_thread = threading.Thread(target=annotations_stage, daemon=True)
+        annotations_thread.start()
+
+        def upload_batch(lane_batch, images_bytes):
+            if len(annotations_errors) > 0:
+                raise annotations_errors[0]
+            lane, images_batch = lane_batch
             images_ids = [image.id for image in images_batch]
             images_names = [image.name for image in images_batch]
             images_metas = [image.meta for image in images_batch]
             images_paths = [os.path.join(storage_dir, image_name) for image_name in images_names]
             images_hashs = [image.hash for image in images_batch]
 
-            images_links = []
-            if is_fast_mode:
-                for image in images:
-                    if image.link is not None:
-                        link = image.link
-                        if need_change_link:
-                            link = change_link(bucket_path, link)
-                        images_links.append(link)
-
-            if len(images_links) == len(images_batch):
+            res_images = None
+            start = time.monotonic()
+            if lane == LANE_EXISTING:
+                sly.logger.info("Current batch of images already exist in destination dataset. Skipping...")
+                res_images = [existing_images[name] for name in images_names]
+            elif lane == LANE_LINK:
+                images_links = [image.link for image in images_batch]
+                if need_change_link:
+                    images_links = [change_link(bucket_path, link) for link in images_links]
                 try:
                     res_images = api.image.upload_links(
                         dataset_id=res_dataset.id,
@@ -162,28 +761,75 @@ def process_images(
                             break
                     if success is False:
                         api.image.remove_batch(ids=[image.id for image in res_images])
+                        res_images = None
                         sly.logger.warn(
                             "Links are not accessible or invalid. Attempting to download images with paths"
                         )
-                        raise Exception(
-                            "Links are not accessible or invalid. Attempting to download images with paths"
-                        )
-
                 except Exception:
-                    res_images = download_upload_images(
-                        foreign_api,
+                    res_images = None
+                if res_images is None:
+                    lane_batch_sizes[lane].record(
+                        len(images_batch), time.monotonic() - start, error=True
+                    )
+            elif lane == LANE_HASH:
+                try:
+                    res_images = retry_items(
+                        lambda items: api.image.upload_hashes(
+                            dataset_id=res_dataset.id,
+                            names=[name for name, _, _ in items],
+                            hashes=[hash for _, hash, _ in items],
+                            metas=[meta for _, _, meta in items],
+                            batch_size=len(images_batch),
+                        ),
+                        list(zip(images_names, images_hashs, images_metas)),
+                        [api],
+                        find_done=find_created(api.image, res_dataset, lambda item: item[0]),
+                        name="images upload",
+                    )
+                except Exception:
+                    sly.logger.info("Failed uploading images by hash. Attempting to upload images with paths.")
+                    lane_batch_sizes[lane].record(
+                        len(images_batch), time.monotonic() - start, error=True
+                    )
+            elif lane == LANE_BYTES and len(images_bytes) > 0:
+                try:
+                    in_memory = [image for image in images_batch if image.id in images_bytes]
+                    res_images_map = {}
+                    uploaded = upload_images_bytes(
                         api,
-                        dataset,
                         res_dataset,
-                        images_ids,
-                        images_paths,
-                        images_names,
-                        images_metas,
-                        images_hashs,
-                        existing_images,
+                        [image.name for image in in_memory],
+                        [images_bytes[image.id] for image in in_memory],
+                        [image.meta for image in in_memory],
                     )
-            else:
-                res_images = download_upload_images(
+                    for image, res_image in zip(in_memory, uploaded):
+                        res_images_map[image.name] = res_image
+                    on_disk = [image for image in images_batch if image.id not in images_bytes]
+                    if len(on_disk) > 0:
+                        uploaded = upload_images(
+                            foreign_api,
+                            api,
+                            dataset,
+                            res_dataset,
+                            [image.id for image in on_disk],
+                            [os.path.join(storage_dir, image.name) for image in on_disk],
+                            [image.name for image in on_disk],
+                            [image.meta for image in on_disk],
+                            [image.hash for image in on_disk],
+                        )
+                        for image, res_image in zip(on_disk, uploaded):
+                            res_images_map[image.name] = res_image
+                    res_images = [res_images_map[name] for name in images_names]
+                except Exception:
+                    lane_batch_sizes[lane].record(
+                        len(images_batch), time.monotonic() - start, error=True
+                    )
+                    raise
+                finally:
+                    memory_budget.release(reserved.pop(images_batch[0].id, 0))
+
+            if res_images is None:
+                res_images = upload_images(
                     foreign_api,
                     api,
                     dataset,
@@ -193,17 +839,44 @@ def process_images(
                     images_names,
                     images_metas,
                     images_hashs,
-                    existing_images,
                 )
+            elif lane != LANE_EXISTING:
+                nbytes = None
+                if lane == LANE_BYTES:
+                    nbytes = sum([image.size or 0 for image in images_batch])
+                lane_batch_sizes[lane].record(len(images_batch), time.monotonic() - start, nbytes)
 
+            for image in res_images:
+                if image.hash is not None:
+                    hashes_cache[image.hash] = True
             res_images_ids = [image.id for image in res_images]
-            annotations = foreign_api.annotation.download_json_batch(
-                dataset_id=dataset.id,
-                image_ids=images_ids,
-                force_metadata_for_links=False,
-            )
-            api.annotation.upload_jsons(img_ids=res_images_ids, ann_jsons=annotations)
-            pbar.update(len(images_batch))
+            annotations_queue.put((images_ids, res_images_ids))
+
+        try:
+            run_pipeline(lane_batches(), fetch_batch, upload_batch, queue_depth, stop)
+        except Exception:
+            annotations_stop.set()
+            raise
+        finally:
+            for size in reserved.values():
+                memory_budget.release(size)
+            annotations_queue.put(None)
+            annotations_thread.join()
+        if len(annotations_errors) > 0:
+            raise annotations_errors[0]
+
+
+def stream_video(api: sly.Api, foreign_api: sly.Api, video: VideoInfo):
+    # pass video binary from foreign download response to destination upload request chunk
+    # by chunk, the file is never stored on disk and only one chunk is held in memory
+    def open_stream(video_id):
+        response = foreign_api.video._download(video_id, is_stream=True)
+        size = response.headers.get("Content-Length") or (video.file_meta or {}).get("size")
+        if size is None:
+            raise ValueError(f"Size of video {video.name} is unknown")
+        return ChunkedStream(response, size, VIDEO_CHUNK_SIZE)
+
+    api.video._upload_data_bulk(open_stream, [(video.id, video.hash)])
 
 
 def process_videos(
@@ -216,45 +889,123 @@ def process_videos(
     is_fast_mode: bool = False,
     need_change_link: bool = False,
     bucket_path: str = None,
+    hashes_cache: Dict[str, bool] = None,
+    journal: Journal = None,
+    max_workers: int = VIDEO_MAX_WORKERS,
 ):
-    storage_dir = "storage"
+    storage_dir = os.path.join("storage", str(dataset.id))
     mkdir(storage_dir, True)
-    key_id_map = KeyIdMap()
     videos: List[VideoInfo] = foreign_api.video.get_list(dataset_id=dataset.id, raw_video_meta=True)
+
+    def import_video(video: VideoInfo, res_video: VideoInfo = None):
+        if res_video is None and video.hash is not None:
+            try:
+                retry_call([foreign_api, api], "video upload", stream_video, api, foreign_api, video)
+                res_video = api.video.upload_hash(
+                    dataset_id=res_dataset.id, name=video.name, hash=video.hash
+                )
+            except Exception:
+                sly.logger.info(f"Failed streaming video {video.name}. Video will be downloaded.")
+        if res_video is None:
+            video_path = os.path.join(storage_dir, video.name)
+            foreign_api.video.download_path(id=video.id, path=video_path)
+            res_video = api.video.upload_path(
+                dataset_id=res_dataset.id,
+                name=video.name,
+                path=video_path,
+                meta=video.meta,
+            )
+            silent_remove(video_path)
+        return res_video
+
     with progress_items(
         message=f"Importing videos from dataset: {dataset.name}", total=len(videos)
     ) as pbar:
-        for video in videos:
-            try:
-                if video.link is not None and is_fast_mode:
-                    link = video.link
-                    if need_change_link:
-                        link = change_link(bucket_path, link)
-                    res_video = api.video.upload_link(
-                        dataset_id=res_dataset.id, link=link, name=video.name, skip_download=True
-                    )
-                elif video.hash is not None:
-                    res_video = api.video.upload_hash(
-                        dataset_id=res_dataset.id, name=video.name, hash=video.hash
-                    )
-            except Exception:
-                video_path = os.path.join(storage_dir, video.name)
-                foreign_api.video.download_path(id=video.id, path=video_path)
-                res_video = api.video.upload_path(
+        done_ids = set()
+        if journal is not None:
+            done_ids = journal.get_done("video", parent=dataset.id)
+        skipped = [video for video in videos if str(video.id) in done_ids]
+        pbar.update(len(skipped))
+        videos = [video for video in videos if str(video.id) not in done_ids]
+
+        # videos available in destination by link or hash are registered in bulk,
+        # binaries are transferred only for the rest
+        def get_link(video: VideoInfo):
+            if need_change_link:
+                return change_link(bucket_path, video.link)
+            return video.link
+
+        registered = get_existing_items(api.video, res_dataset, videos)
+        link_videos = []
+        if is_fast_mode:
+            link_videos = [
+                video for video in videos if video.link is not None and video.id not in registered
+            ]
+        registered.update(
+            register_items(
+                link_videos,
+                lambda batch: api.video.upload_links(
+                    dataset_id=res_dataset.id,
+                    links=[get_link(video) for video in batch],
+                    names=[video.name for video in batch],
+                    skip_download=True,
+                ),
+                lambda video: api.video.upload_link(
                     dataset_id=res_dataset.id,
+                    link=get_link(video),
                     name=video.name,
-                    path=video_path,
-                    meta=video.meta,
-                )
-                silent_remove(video_path)
+                    skip_download=True,
+                ),
+                find_done=find_created(api.video, res_dataset),
+            )
+        )
+        hash_videos = [
+            video for video in videos if video.id not in registered and video.hash is not None
+        ]
+        existing_hashes = check_existing_hashes(
+            api, [video.hash for video in hash_videos], hashes_cache, api.video
+        )
+        registered.update(
+            register_items(
+                [video for video in hash_videos if video.hash in existing_hashes],
+                lambda batch: api.video.upload_hashes(
+                    dataset_id=res_dataset.id,
+                    names=[video.name for video in batch],
+                    hashes=[video.hash for video in batch],
+                ),
+                lambda video: api.video.upload_hash(
+                    dataset_id=res_dataset.id, name=video.name, hash=video.hash
+                ),
+                find_done=find_created(api.video, res_dataset),
+            )
+        )
 
-            ann_json = foreign_api.video.annotation.download(video_id=video.id)
+        def upload_annotation(video: VideoInfo, res_video: VideoInfo, ann_json: dict):
+            key_id_map = KeyIdMap()
             ann = sly.VideoAnnotation.from_json(
                 data=ann_json, project_meta=meta, key_id_map=key_id_map
             )
             api.video.annotation.append(video_id=res_video.id, ann=ann, key_id_map=key_id_map)
+            if journal is not None:
+                journal.mark_done("video", [video.id], parent=dataset.id)
             pbar.update()
 
+        # videos are transferred by a few workers, annotations are copied by their own stage
+        with AnnotationsStage(
+            foreign_api, dataset, foreign_api.video.annotation, upload_annotation
+        ) as annotations, ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            futures = {
+                executor.submit(import_video, video, registered.get(video.id)): video
+                for video in videos
+            }
+            try:
+                for future in as_completed(futures):
+                    annotations.put(futures[future], future.result())
+            except Exception:
+                for future in futures:
+                    future.cancel()
+                raise
+
 
 def process_volumes(
     api: sly.Api,
@@ -266,53 +1017,110 @@ def process_volumes(
     is_fast_mode: bool = False,
     need_change_link: bool = False,
     bucket_path: str = None,
+    hashes_cache: Dict[str, bool] = None,
+    journal: Journal = None,
 ):
-    storage_dir = "storage"
+    storage_dir = os.path.join("storage", str(dataset.id))
     mkdir(storage_dir, True)
-    key_id_map = KeyIdMap()
-    geometries_dir = f"geometries_{dataset.id}"
-    sly.fs.mkdir(geometries_dir, True)
     volumes: List[VolumeInfo] = foreign_api.volume.get_list(dataset_id=dataset.id)
     with progress_items(
         message=f"Importing volumes from dataset: {dataset.name}", total=len(volumes)
     ) as pbar:
         # sly.download_volume_project
-        for volume in volumes:
-            if volume.hash:
-                res_volume = api.volume.upload_hash(
-                    dataset_id=res_dataset.id,
-                    name=volume.name,
-                    hash=volume.hash,
-                    meta=volume.meta,
-                )
-            else:
-                volume_path = os.path.join(storage_dir, volume.name)
-                foreign_api.volume.download_path(id=volume.id, path=volume_path)
-                res_volume = api.volume.upload_nrrd_serie_path(
-                    dataset_id=res_dataset.id, name=volume.name, path=volume_path
+        done_ids, annotated_ids = set(), set()
+        if journal is not None:
+            done_ids = journal.get_done("volume", parent=dataset.id)
+            annotated_ids = journal.get_done("volume_annotated", parent=dataset.id)
+        pending_volumes = [volume for volume in volumes if str(volume.id) not in done_ids]
+        reused = get_existing_items(api.volume, res_dataset, pending_volumes)
+        # annotation of these volumes was copied but their meshes were not, they are imported
+        # again from scratch, so figures are not duplicated
+        for volume in pending_volumes:
+            if volume.id in reused and str(volume.id) in annotated_ids:
+                api.volume.remove(reused.pop(volume.id).id)
+        registered = register_items(
+            [volume for volume in pending_volumes if volume.hash and volume.id not in reused],
+            lambda batch: api.volume.upload_hashes(
+                dataset_id=res_dataset.id,
+                names=[volume.name for volume in batch],
+                hashes=[volume.hash for volume in batch],
+                metas=[volume.meta for volume in batch],
+            ),
+            lambda volume: api.volume.upload_hash(
+                dataset_id=res_dataset.id,
+                name=volume.name,
+                hash=volume.hash,
+                meta=volume.meta,
+            ),
+            find_done=find_created(api.volume, res_dataset),
+        )
+        registered.update(reused)
+
+        shared_pbar = SharedProgress(pbar)
+
+        def volume_done(volume: VolumeInfo):
+            if journal is not None:
+                journal.mark_done("volume", [volume.id], parent=dataset.id)
+            shared_pbar.update()
+
+        def transfer_meshes(volume: VolumeInfo, figure_ids: Dict[int, int]):
+            # meshes are downloaded a few figures per request and every mesh is uploaded
+            # right away, so only one group of meshes per worker is held in memory
+            for ids in batched(list(figure_ids.keys()), MESH_BATCH_SIZE):
+                parts = retry_call(
+                    [foreign_api],
+                    "meshes download",
+                    lambda: list(foreign_api.volume.figure._download_geometries_batch(ids)),
                 )
-                silent_remove(volume_path)
+                for figure_id, part in parts:
+                    retry_call(
+                        [api],
+                        "meshes upload",
+                        api.volume.figure._upload_meshes_batch,
+                        {figure_ids[figure_id]: part.content},
+                    )
+                del parts
+            volume_done(volume)
 
-            ann_json = foreign_api.volume.annotation.download(volume_id=volume.id)
+        meshes_futures = []
+
+        def upload_annotation(volume: VolumeInfo, res_volume: VolumeInfo, ann_json: dict):
+            key_id_map = KeyIdMap()
             ann = sly.VolumeAnnotation.from_json(
                 data=ann_json, project_meta=meta, key_id_map=key_id_map
             )
+            # ids of foreign figures, key_id_map gets destination ids on append
+            figure_keys = {
+                key_id_map.get_figure_id(sf.key()): sf.key() for sf in ann.spatial_figures
+            }
             api.volume.annotation.append(volume_id=res_volume.id, ann=ann, key_id_map=key_id_map)
-            if ann.spatial_figures:
-                geometries = []
-                for sf in ann_json.get("spatialFigures"):
-                    sf_id = sf.get("id")
-                    path = os.path.join(geometries_dir, f"{sf_id}.nrrd")
-                    foreign_api.volume.figure.download_stl_meshes([sf_id], [path])
-                    with open(path, "rb") as file:
-                        geometry_bytes = file.read()
-                    geometries.append(geometry_bytes)
-                api.volume.figure.upload_sf_geometry(
-                    ann.spatial_figures, geometries, key_id_map=key_id_map
-                )
-                del geometries
-            pbar.update()
-        sly.fs.remove_dir(geometries_dir)
+            if len(figure_keys) == 0:
+                volume_done(volume)
+                return
+            figure_ids = {id: key_id_map.get_figure_id(key) for id, key in figure_keys.items()}
+            if journal is not None:
+                journal.mark_done("volume_annotated", [volume.id], parent=dataset.id)
+            meshes_futures.append(meshes_executor.submit(transfer_meshes, volume, figure_ids))
+
+        meshes_executor = ThreadPoolExecutor(max_workers=max(1, MESH_MAX_WORKERS))
+        with meshes_executor, AnnotationsStage(
+            foreign_api, dataset, foreign_api.volume.annotation, upload_annotation
+        ) as annotations:
+            for volume in volumes:
+                if str(volume.id) in done_ids:
+                    pbar.update()
+                    continue
+                res_volume = registered.get(volume.id)
+                if res_volume is None:
+                    volume_path = os.path.join(storage_dir, volume.name)
+                    foreign_api.volume.download_path(id=volume.id, path=volume_path)
+                    res_volume = api.volume.upload_nrrd_serie_path(
+                        dataset_id=res_dataset.id, name=volume.name, path=volume_path
+                    )
+                    silent_remove(volume_path)
+                annotations.put(volume, res_volume)
+        for future in meshes_futures:
+            future.result()
 
 
 def process_pcd(
@@ -325,8 +1133,10 @@ def process_pcd(
     is_fast_mode: bool = False,
     need_change_link: bool = False,
     bucket_path: str = None,
+    hashes_cache: Dict[str, bool] = None,
+    journal: Journal = None,
 ):
-    storage_dir = "storage"
+    storage_dir = os.path.join("storage", str(dataset.id))
     mkdir(storage_dir, True)
     key_id_map_initial = KeyIdMap()
     key_id_map_new = KeyIdMap()
@@ -334,44 +1144,91 @@ def process_pcd(
     with progress_items(
         message=f"Importing point clouds from dataset: {dataset.name}", total=len(pcds)
     ) as pbar:
-        for pcd in pcds:
-            if pcd.hash:
-                res_pcd = api.pointcloud.upload_hash(
-                    dataset_id=res_dataset.id,
-                    name=pcd.name,
-                    hash=pcd.hash,
-                    meta=pcd.meta,
-                )
-            else:
-                pcd_path = os.path.join(storage_dir, pcd.name)
-                foreign_api.pointcloud.download_path(id=pcd.id, path=pcd_path)
-                res_pcd = api.pointcloud.upload_path(
-                    dataset_id=res_dataset.id, name=pcd.name, path=pcd_path, meta=pcd.meta
-                )
-                silent_remove(pcd_path)
+        done_ids = set()
+        if journal is not None:
+            done_ids = journal.get_done("pointcloud", parent=dataset.id)
+        pending_pcds = [pcd for pcd in pcds if str(pcd.id) not in done_ids]
+        reused = get_existing_items(api.pointcloud, res_dataset, pending_pcds)
+        hash_pcds = [pcd for pcd in pending_pcds if pcd.hash and pcd.id not in reused]
+        existing_hashes = check_existing_hashes(
+            api, [pcd.hash for pcd in hash_pcds], hashes_cache, api.pointcloud
+        )
+        registered = register_items(
+            [pcd for pcd in hash_pcds if pcd.hash in existing_hashes],
+            lambda batch: api.pointcloud.upload_hashes(
+                dataset_id=res_dataset.id,
+                names=[pcd.name for pcd in batch],
+                hashes=[pcd.hash for pcd in batch],
+                metas=[pcd.meta for pcd in batch],
+            ),
+            lambda pcd: api.pointcloud.upload_hash(
+                dataset_id=res_dataset.id,
+                name=pcd.name,
+                hash=pcd.hash,
+                meta=pcd.meta,
+            ),
+            find_done=find_created(api.pointcloud, res_dataset),
+        )
+        registered.update(reused)
 
-            ann_json = foreign_api.pointcloud.annotation.download(pointcloud_id=pcd.id)
+        def upload_annotation(pcd: PointcloudInfo, res_pcd: PointcloudInfo, ann_json: dict):
             ann = sly.PointcloudAnnotation.from_json(
                 data=ann_json, project_meta=meta, key_id_map=key_id_map_initial
             )
             api.pointcloud.annotation.append(
                 pointcloud_id=res_pcd.id, ann=ann, key_id_map=key_id_map_new
             )
-            rel_images = foreign_api.pointcloud.get_list_related_images(id=pcd.id)
-            if len(rel_images) != 0:
-                rimg_infos = []
-                for rel_img in rel_images:
-                    rimg_infos.append(
-                        {
-                            ApiField.ENTITY_ID: res_pcd.id,
-                            ApiField.NAME: rel_img[ApiField.NAME],
-                            ApiField.HASH: rel_img[ApiField.HASH],
-                            ApiField.META: rel_img[ApiField.META],
-                        }
+            if journal is not None:
+                journal.mark_done("pointcloud", [pcd.id], parent=dataset.id)
+            pbar.update()
+
+        related_images = list_related_images(foreign_api, dataset)
+        # related images of reused point clouds may be attached already
+        res_related_images = {}
+        if len(reused) > 0:
+            res_related_images = list_related_images(api, res_dataset)
+        for pcd_id in list(related_images.keys()):
+            res_pcd = reused.get(pcd_id)
+            is_attached = res_pcd is not None and res_pcd.id in res_related_images
+            if str(pcd_id) in done_ids or is_attached:
+                del related_images[pcd_id]
+        transfer_related_images(api, foreign_api, dataset, related_images, hashes_cache)
+
+        # related images are attached in large batches, point clouds are passed to the
+        # annotations stage only after their related images are attached
+        pending = []
+        pending_infos = []
+
+        def flush_related_images():
+            add_related_images(api.pointcloud, pending_infos)
+            for pcd, res_pcd in pending:
+                annotations.put(pcd, res_pcd)
+            pending.clear()
+            pending_infos.clear()
+
+        with AnnotationsStage(
+            foreign_api, dataset, foreign_api.pointcloud.annotation, upload_annotation
+        ) as annotations:
+            for pcd in pcds:
+                if str(pcd.id) in done_ids:
+                    pbar.update()
+                    continue
+                res_pcd = registered.get(pcd.id)
+                if res_pcd is None:
+                    pcd_path = os.path.join(storage_dir, pcd.name)
+                    foreign_api.pointcloud.download_path(id=pcd.id, path=pcd_path)
+                    res_pcd = api.pointcloud.upload_path(
+                        dataset_id=res_dataset.id, name=pcd.name, path=pcd_path, meta=pcd.meta
                     )
-                api.pointcloud.add_related_images(rimg_infos)
+                    silent_remove(pcd_path)
 
-            pbar.update()
+                pending.append((pcd, res_pcd))
+                pending_infos.extend(
+                    get_related_images_infos(related_images.get(pcd.id, []), res_pcd.id)
+                )
+                if len(pending_infos) >= RELATED_IMAGES_BATCH_SIZE or len(pending) >= BATCH_SIZE:
+                    flush_related_images()
+            flush_related_images()
 
 
 def process_pcde(
@@ -384,57 +1241,144 @@ def process_pcde(
     is_fast_mode: bool = False,
     need_change_link: bool = False,
     bucket_path: str = None,
+    hashes_cache: Dict[str, bool] = None,
+    journal: Journal = None,
+    max_workers: int = EPISODE_MAX_WORKERS,
 ):
-    storage_dir = "storage"
+    storage_dir = os.path.join("storage", str(dataset.id))
     mkdir(storage_dir, True)
     key_id_map = KeyIdMap()
     pcdes = foreign_api.pointcloud_episode.get_list(dataset_id=dataset.id)
+    pcdes = sorted(pcdes, key=lambda pcde: (pcde.meta or {}).get("frame", 0))
+
+    # Only episode objects are parsed at once. Frames are kept as JSON and converted right
+    # before the chunk of frames they belong to is uploaded, then they are released.
     ann_json = foreign_api.pointcloud_episode.annotation.download(dataset_id=dataset.id)
-    ann = sly.PointcloudEpisodeAnnotation.from_json(
-        data=ann_json, project_meta=meta, key_id_map=KeyIdMap()
+    frames_json = {frame["index"]: frame for frame in ann_json.pop("frames", [])}
+    foreign_key_id_map = KeyIdMap()
+    objects = PointcloudEpisodeObjectCollection.from_json(
+        ann_json.get("objects", []), meta, foreign_key_id_map
     )
-    frame_to_pointcloud_ids = {}
+    del ann_json
+
     with progress_items(
         message=f"Importing point cloud episodes from dataset: {dataset.name}", total=len(pcdes)
     ) as pbar:
-        for pcde in pcdes:
-            if pcde.hash:
-                res_pcde = api.pointcloud_episode.upload_hash(
-                    dataset_id=res_dataset.id,
-                    name=pcde.name,
-                    hash=pcde.hash,
-                    meta=pcde.meta,
-                )
-            else:
+        # frames copied before the session restart are skipped, destination ids of episode
+        # objects are restored, so figures of the rest frames refer to the same objects
+        done_ids, objects_ids = set(), {}
+        if journal is not None:
+            done_ids = journal.get_done("episode_frame", parent=dataset.id)
+            for entry in journal.get_done("episode_object", parent=dataset.id):
+                foreign_id, res_id = entry.split(":")
+                objects_ids[int(foreign_id)] = int(res_id)
+        if len(objects_ids) > 0:
+            for obj in objects:
+                foreign_id = foreign_key_id_map.get_object_id(obj.key())
+                key_id_map.add_object(obj.key(), objects_ids[foreign_id])
+        pbar.update(len([pcde for pcde in pcdes if str(pcde.id) in done_ids]))
+        pcdes = [pcde for pcde in pcdes if str(pcde.id) not in done_ids]
+
+        reused = get_existing_items(api.pointcloud_episode, res_dataset, pcdes)
+        hash_pcdes = [pcde for pcde in pcdes if pcde.hash and pcde.id not in reused]
+        existing_hashes = check_existing_hashes(
+            api, [pcde.hash for pcde in hash_pcdes], hashes_cache, api.pointcloud_episode
+        )
+        registered = register_items(
+            [pcde for pcde in hash_pcdes if pcde.hash in existing_hashes],
+            lambda batch: api.pointcloud_episode.upload_hashes(
+                dataset_id=res_dataset.id,
+                names=[pcde.name for pcde in batch],
+                hashes=[pcde.hash for pcde in batch],
+                metas=[pcde.meta for pcde in batch],
+            ),
+            lambda pcde: api.pointcloud_episode.upload_hash(
+                dataset_id=res_dataset.id,
+                name=pcde.name,
+                hash=pcde.hash,
+                meta=pcde.meta,
+            ),
+            find_done=find_created(api.pointcloud_episode, res_dataset),
+        )
+        registered.update(reused)
+        related_images = list_related_images(foreign_api, dataset)
+        # related images of reused frames may be attached already
+        res_related_images = {}
+        if len(reused) > 0:
+            res_related_images = list_related_images(api, res_dataset)
+        pcdes_ids = set([pcde.id for pcde in pcdes])
+        for pcde_id in list(related_images.keys()):
+            res_pcde = reused.get(pcde_id)
+            is_attached = res_pcde is not None and res_pcde.id in res_related_images
+            if pcde_id not in pcdes_ids or is_attached:
+                del related_images[pcde_id]
+        transfer_related_images(api, foreign_api, dataset, related_images, hashes_cache)
+
+        def import_frame(pcde):
+            res_pcde = registered.get(pcde.id)
+            if res_pcde is None:
                 pcde_path = os.path.join(storage_dir, pcde.name)
                 foreign_api.pointcloud_episode.download_path(id=pcde.id, path=pcde_path)
                 res_pcde = api.pointcloud_episode.upload_path(
                     dataset_id=res_dataset.id, name=pcde.name, path=pcde_path, meta=pcde.meta
                 )
                 silent_remove(pcde_path)
+            return res_pcde
 
-            frame_to_pointcloud_ids[res_pcde.meta["frame"]] = res_pcde.id
-            rel_images = foreign_api.pointcloud_episode.get_list_related_images(id=pcde.id)
-            if len(rel_images) != 0:
-                rimg_infos = []
-                for rel_img in rel_images:
-                    rimg_infos.append(
-                        {
-                            ApiField.ENTITY_ID: res_pcde.id,
-                            ApiField.NAME: rel_img[ApiField.NAME],
-                            ApiField.HASH: rel_img[ApiField.HASH],
-                            ApiField.META: rel_img[ApiField.META],
-                        }
-                    )
-                api.pointcloud_episode.add_related_images(rimg_infos)
-            pbar.update()
+        # frames of a chunk are copied by a few workers while annotations of the previous
+        # chunk are uploaded
+        executor = ThreadPoolExecutor(max_workers=max(1, max_workers))
 
-        api.pointcloud_episode.annotation.append(
-            dataset_id=res_dataset.id,
-            ann=ann,
-            frame_to_pointcloud_ids=frame_to_pointcloud_ids,
-            key_id_map=key_id_map,
-        )
+        def import_chunk(chunk):
+            return list(executor.map(import_frame, chunk))
+
+        objects_uploaded = len(objects_ids) > 0
+
+        def upload_chunk(chunk, res_pcdes):
+            nonlocal objects_uploaded
+            frame_to_pointcloud_ids = {}
+            related_images_infos = []
+            for pcde, res_pcde in zip(chunk, res_pcdes):
+                frame_to_pointcloud_ids[res_pcde.meta["frame"]] = res_pcde.id
+                related_images_infos.extend(
+                    get_related_images_infos(related_images.pop(pcde.id, []), res_pcde.id)
+                )
+            add_related_images(api.pointcloud_episode, related_images_infos)
+
+            if not objects_uploaded:
+                # objects are created once for the episode, figures refer to them by key_id_map
+                api.pointcloud_episode.object.append_bulk(res_pcdes[0].id, objects, key_id_map)
+                objects_uploaded = True
+                if journal is not None:
+                    entries = [
+                        f"{foreign_key_id_map.get_object_id(obj.key())}:"
+                        f"{key_id_map.get_object_id(obj.key())}"
+                        for obj in objects
+                    ]
+                    journal.mark_done("episode_object", entries, parent=dataset.id)
+            chunk_frames_json = [
+                frames_json.pop(index)
+                for index in sorted(frame_to_pointcloud_ids.keys())
+                if index in frames_json
+            ]
+            frames = PointcloudEpisodeFrameCollection.from_json(
+                chunk_frames_json, objects, key_id_map=foreign_key_id_map
+            )
+            figures, pointcloud_ids = [], []
+            for frame in frames:
+                for figure in frame.figures:
+                    figures.append(figure)
+                    pointcloud_ids.append(frame_to_pointcloud_ids[frame.index])
+            if len(figures) > 0:
+                api.pointcloud_episode.figure.append_to_dataset(
+                    res_dataset.id, figures, pointcloud_ids, key_id_map
+                )
+            if journal is not None:
+                journal.mark_done("episode_frame", [pcde.id for pcde in chunk], parent=dataset.id)
+            pbar.update(len(chunk))
+
+        with executor:
+            run_pipeline(batched(pcdes, EPISODE_FRAMES_CHUNK), import_chunk, upload_chunk, 1)
 
 
 def get_ws_projects_map(ws_collapse):
@@ -456,6 +1400,65 @@ process_type_map = {
 }
 
 
+def prepare_project(
+    api: sly.Api,
+    foreign_api: sly.Api,
+    res_workspace: sly.WorkspaceInfo,
+    project: sly.ProjectInfo,
+    ws_collision_value: str = "check",
+    resume: bool = False,
+):
+    # create destination project and datasets according to the collision option,
+    # returns None if the project must be skipped
+    temp_ws_collision = ws_collision_value
+    res_project = api.project.get_info_by_name(res_workspace.id, project.name)
+    if res_project is not None and resume:
+        # project was partially imported before the session restart
+        sly.logger.info(f"Project {project.name} was partially imported. Resuming...")
+        temp_ws_collision = "resume"
+    elif res_project is not None and res_project.type != str(sly.ProjectType.IMAGES) and temp_ws_collision == "check":
+        temp_ws_collision = "ignore"
+        sly.logger.info("Changing collision value to 'ignore' for non-image projects.")
+    if res_project is None:
+        res_project = api.project.create(
+            res_workspace.id,
+            project.name,
+            description=project.description,
+            type=project.type,
+        )
+    elif res_project is not None and temp_ws_collision == "reupload":
+        api.project.remove(res_project.id)
+        res_project = api.project.create(
+            res_workspace.id,
+            project.name,
+            description=project.description,
+            type=project.type,
+        )
+
+    elif res_project is not None and temp_ws_collision == "ignore":
+        sly.logger.info(f"Project {project.name} already exists in destination workspace. Skipping...")
+        return None
+
+    elif res_project is not None and temp_ws_collision == "check":
+        sly.logger.info(f"Project {project.name} already exists in destination workspace. Checking...")
+
+    meta_json = get_project_meta(foreign_api, project.id)
+    api.project.update_meta(res_project.id, meta_json)
+    cache.invalidate(api, "meta", res_project.id)
+    meta = sly.ProjectMeta.from_json(meta_json)
+
+    datasets = get_datasets(foreign_api, project.id)
+    datasets_pairs = []
+    for dataset in datasets:
+        res_dataset = api.dataset.get_info_by_name(res_project.id, dataset.name)
+        if res_dataset is None:
+            res_dataset = api.dataset.create(
+                res_project.id, dataset.name, description=dataset.description
+            )
+        datasets_pairs.append((dataset, res_dataset))
+    return meta, datasets_pairs
+
+
 def import_workspaces(
     api: sly.Api,
     foreign_api: sly.Api,
@@ -470,11 +1473,15 @@ def import_workspaces(
     is_fast_mode: bool = False,
     change_link_flag: bool = False,
     bucket_path: str = None,
+    max_workers: int = MAX_WORKERS,
+    journal: Journal = None,
 ):
-    team = foreign_api.team.get_info_by_id(team_id)
+    limit_requests(foreign_api, FOREIGN_MAX_REQUESTS)
+    limit_requests(api, DESTINATION_MAX_REQUESTS)
+    team = get_team(foreign_api, team_id)
 
     if is_import_all_ws:
-        workspaces = foreign_api.workspace.get_list(team_id=team_id)
+        workspaces = get_workspaces(foreign_api, team_id)
     else:
         ws_projects_map = get_ws_projects_map(ws_collapse)
         for ws in ws_collapse._items:
@@ -483,95 +1490,150 @@ def import_workspaces(
             for project in projects.get_transferred_items():
                 ws_projects_map[ws.name].append(project)
         workspaces = [
-            foreign_api.workspace.get_info_by_id(workspace_id)
+            get_workspace(foreign_api, workspace_id)
             for workspace_id in ws_projects_map
             if len(ws_projects_map[workspace_id]) > 0
         ]
 
-    res_team = api.team.get_info_by_name(team.name)
+    res_team = get_team_by_name(api, team.name)
     if res_team is None:
         res_team = api.team.create(team.name, description=team.description)
+        cache.put(api, "team_by_name", res_team.name, res_team)
+
+    # projects are listed before the import starts to know totals of the progress bars
+    ws_projects = []
+    for workspace in workspaces:
+        res_workspace = api.workspace.get_info_by_name(res_team.id, workspace.name)
+        if res_workspace is None:
+            res_workspace = api.workspace.create(
+                res_team.id, workspace.name, description=workspace.description
+            )
+
+        if is_import_all_ws:
+            projects = get_projects(foreign_api, workspace.id)
+        else:
+            projects = [
+                get_project(foreign_api, project_id)
+                for project_id in ws_projects_map[workspace.id]
+            ]
+        if journal is not None:
+            done_projects = journal.get_done("project", parent=workspace.id)
+            projects = [project for project in projects if str(project.id) not in done_projects]
+        ws_projects.append((workspace, res_workspace, projects))
+    all_projects = [project for _, _, projects in ws_projects for project in projects]
 
+    # Projects and datasets are independent, so they are processed by a pool of workers.
+    # Project job creates destination project and datasets, then every dataset is
+    # submitted as a separate job. Progress bars are updated from this thread only,
+    # items of all running datasets are reported to the same bar.
     with progress_ws(
         message=f"Importing workspaces from team: {team.name}", total=len(workspaces)
-    ) as pbar_ws:
-        for workspace in workspaces:
-            res_workspace = api.workspace.get_info_by_name(res_team.id, workspace.name)
-            if res_workspace is None:
-                res_workspace = api.workspace.create(
-                    res_team.id, workspace.name, description=workspace.description
-                )
+    ) as pbar_ws, progress_pr(
+        message=f"Importing projects from team: {team.name}", total=len(all_projects)
+    ) as pbar_pr, progress_ds(
+        message=f"Importing datasets from team: {team.name}",
+        total=sum([project.datasets_count or 0 for project in all_projects]),
+    ) as pbar_ds, progress_items(
+        message=f"Importing items from team: {team.name}",
+        total=sum([project.items_count or 0 for project in all_projects]),
+    ) as pbar_items:
+        shared_progress_items = SharedProgress(pbar_items)
+        remaining_projects = {}
+        remaining_datasets = {}
 
-            if is_import_all_ws:
-                projects = foreign_api.project.get_list(workspace.id)
-            else:
-                projects = [
-                    foreign_api.project.get_info_by_id(project_id)
-                    for project_id in ws_projects_map[workspace.id]
-                ]
-            with progress_pr(
-                message=f"Importing projects from workspace: {workspace.name}", total=len(projects)
-            ) as pbar_pr:
+        def project_done(workspace, project):
+            if journal is not None:
+                journal.mark_done("project", [project.id], parent=workspace.id)
+            pbar_pr.update()
+            remaining_projects[workspace.id] -= 1
+            if remaining_projects[workspace.id] == 0:
+                workspace_done(workspace)
+
+        def workspace_done(workspace):
+            # workspaces are not journaled, only their projects are: a workspace is complete
+            # only for the projects selected in this run
+            pbar_ws.update()
+
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        futures = {}
+        try:
+            for workspace, res_workspace, projects in ws_projects:
+                remaining_projects[workspace.id] = len(projects)
+                if len(projects) == 0:
+                    workspace_done(workspace)
                 for project in projects:
-                    temp_ws_collision = ws_collision_value
-                    res_project = api.project.get_info_by_name(res_workspace.id, project.name)
-                    if res_project is not None and res_project.type != str(sly.ProjectType.IMAGES) and temp_ws_collision == "check":
-                        temp_ws_collision = "ignore"
-                        sly.logger.info("Changing collision value to 'ignore' for non-image projects.")
-                    if res_project is None:
-                        res_project = api.project.create(
-                            res_workspace.id,
-                            project.name,
-                            description=project.description,
-                            type=project.type,
-                        )
-                    elif res_project is not None and temp_ws_collision == "reupload":
-                        api.project.remove(res_project.id)
-                        res_project = api.project.create(
-                            res_workspace.id,
-                            project.name,
-                            description=project.description,
-                            type=project.type,
-                        )
-                    
-                    elif res_project is not None and temp_ws_collision == "ignore":
-                        sly.logger.info(f"Project {project.name} already exists in destination workspace. Skipping...")
-                        pbar_pr.update()
+                    resume = journal is not None and journal.is_done(
+                        "project_prepared", project.id, parent=workspace.id
+                    )
+                    future = executor.submit(
+                        prepare_project,
+                        api,
+                        foreign_api,
+                        res_workspace,
+                        project,
+                        ws_collision_value,
+                        resume,
+                    )
+                    futures[future] = (workspace, project, None)
+
+            while len(futures) > 0:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    workspace, project, dataset = futures.pop(future)
+                    result = future.result()
+                    if dataset is not None:
+                        if journal is not None:
+                            journal.mark_done("dataset", [dataset.id], parent=project.id)
+                        pbar_ds.update()
+                        remaining_datasets[project.id] -= 1
+                        if remaining_datasets[project.id] == 0:
+                            project_done(workspace, project)
                         continue
-                
-                    elif res_project is not None and temp_ws_collision == "check":
-                        sly.logger.info(f"Project {project.name} already exists in destination workspace. Checking...")
-
-                    meta_json = foreign_api.project.get_meta(project.id)
-                    api.project.update_meta(res_project.id, meta_json)
-                    meta = sly.ProjectMeta.from_json(meta_json)
-
-                    datasets = foreign_api.dataset.get_list(project.id)
-                    with progress_ds(
-                        message=f"Importing datasets from project: {project.name}",
-                        total=len(datasets),
-                    ) as pbar_ds:
-                        for dataset in datasets:
-                            res_dataset = api.dataset.get_info_by_name(res_project.id, dataset.name)
-                            if res_dataset is None:
-                                res_dataset = api.dataset.create(
-                                    res_project.id, dataset.name, description=dataset.description
-                                )
-                            process_func = process_type_map.get(project.type)
-                            process_func(
-                                api=api,
-                                foreign_api=foreign_api,
-                                dataset=dataset,
-                                res_dataset=res_dataset,
-                                meta=meta,
-                                progress_items=progress_items,
-                                is_fast_mode=is_fast_mode,
-                                need_change_link=change_link_flag,
-                                bucket_path=bucket_path,
-                            )
-                            pbar_ds.update()
-                    pbar_pr.update()
-            pbar_ws.update()
+
+                    if result is None:
+                        pbar_ds.update(project.datasets_count or 0)
+                        shared_progress_items.update(project.items_count or 0)
+                        project_done(workspace, project)
+                        continue
+                    meta, datasets_pairs = result
+                    if journal is not None:
+                        journal.mark_done("project_prepared", [project.id], parent=workspace.id)
+                        done_datasets = journal.get_done("dataset", parent=project.id)
+                        for dataset, _ in datasets_pairs:
+                            if str(dataset.id) in done_datasets:
+                                pbar_ds.update()
+                                shared_progress_items.update(dataset.items_count or 0)
+                        datasets_pairs = [
+                            (dataset, res_dataset)
+                            for dataset, res_dataset in datasets_pairs
+                            if str(dataset.id) not in done_datasets
+                        ]
+                    remaining_datasets[project.id] = len(datasets_pairs)
+                    if len(datasets_pairs) == 0:
+                        project_done(workspace, project)
+                    # hashes checked in destination are shared between datasets of the project
+                    hashes_cache = {}
+                    process_func = process_type_map.get(project.type)
+                    for dataset, res_dataset in datasets_pairs:
+                        future = executor.submit(
+                            process_func,
+                            api=api,
+                            foreign_api=foreign_api,
+                            dataset=dataset,
+                            res_dataset=res_dataset,
+                            meta=meta,
+                            progress_items=shared_progress_items,
+                            is_fast_mode=is_fast_mode,
+                            need_change_link=change_link_flag,
+                            bucket_path=bucket_path,
+                            hashes_cache=hashes_cache,
+                            journal=journal,
+                        )
+                        futures[future] = (workspace, project, dataset)
+        finally:
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=True)
 
     # progress_ws.hide()
     # progress_pr.hide()
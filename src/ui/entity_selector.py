@@ -1,7 +1,10 @@
 import contextlib
+import os
+from concurrent.futures import ThreadPoolExecutor
 import supervisely as sly
-from typing import List
+from typing import Dict, List, Set
 from supervisely.api.file_api import FileInfo
+from supervisely.api.module_api import ApiField
 from supervisely.app.widgets import (
     Button,
     Checkbox,
@@ -25,12 +28,17 @@ from supervisely.app.widgets import (
 
 import src.globals as g
 import src.ui.team_selector as team_selector
-from src.ui.entities.workspaces import import_workspaces
+from src.ui.entities.workspaces import get_ws_projects_map, import_workspaces
 from src.ui.entities.team_members import import_team_members
 from src.ui.entities.labeling_jobs import import_labeling_jobs
 from src.ui.entities.team_files import import_team_files
+from src.journal import find_journal, open_journal
+from src.cache import dir_cache, get_projects, get_team_by_name, get_team_members, get_workspaces
 
 
+# number of workspaces whose projects are listed at the same time when a team is opened
+PREFETCH_MAX_WORKERS = int(os.environ.get("PREFETCH_MAX_WORKERS", 8))
+
 output_message = Text()
 output_message.hide()
 
@@ -57,6 +65,12 @@ members_container = Container(widgets=[members_field_password, members_collision
 start_import = Button("Start Import")
 start_import.hide()
 
+# journal of an import of the selected team that didn't finish
+journal_message = Text()
+discard_journal = Button("Discard", button_type="warning", button_size="small", plain=True)
+journal_flexbox = Flexbox(widgets=[journal_message, discard_journal])
+journal_flexbox.hide()
+
 import_progress_1 = Progress(hide_on_finish=False)
 import_progress_2 = Progress(hide_on_finish=False)
 import_progress_3 = Progress(hide_on_finish=True)
@@ -148,8 +162,18 @@ members_flexbox = Flexbox(
 )
 
 tf_selector = FileViewer(files_list=[{"path": "/"}])
+files_collision_items = [
+    RadioGroup.Item(value="ignore", label="Skip files that already exists"),
+    RadioGroup.Item(value="sync", label="Copy only new files and files that were changed"),
+]
+files_collision = RadioGroup(files_collision_items, direction="vertical")
+files_field_collision = Field(
+    content=files_collision,
+    title="Files collision",
+    description="Select how to handle files that already exists. Changed files are detected by size, hash and modification time",
+)
 files_collapse_r = ReloadableArea()
-files_collapse = Container(widgets=[])
+files_collapse = Container(widgets=[files_field_collision])
 files_collapse_r.set_content(files_collapse)
 files_collapse.hide()
 
@@ -170,6 +194,7 @@ import_settings = Container(
     widgets=[
         reloadable_area,
         output_message,
+        journal_flexbox,
         start_import,
         import_progress_1,
         import_progress_2,
@@ -187,6 +212,60 @@ card = Card(
 card.lock()
 
 
+def prefetch_projects(workspaces: List[sly.WorkspaceInfo], existing_team: sly.TeamInfo):
+    # Projects of all foreign workspaces are listed concurrently, projects of destination
+    # workspaces with the same names are listed with one request. Returns foreign projects
+    # by workspace id and names of existing destination projects by workspace name.
+    existing_projects_index: Dict[str, Set[str]] = {}
+    if existing_team is not None:
+        names = set([ws.name for ws in workspaces])
+        existing_workspaces = {
+            ws.id: ws.name for ws in g.api.workspace.get_list(existing_team.id) if ws.name in names
+        }
+        for name in existing_workspaces.values():
+            existing_projects_index[name] = set()
+        if len(existing_workspaces) > 0:
+            existing_projects = g.api.project.get_list_all(
+                filters=[
+                    {
+                        ApiField.FIELD: ApiField.WORKSPACE_ID,
+                        ApiField.OPERATOR: "in",
+                        ApiField.VALUE: list(existing_workspaces.keys()),
+                    }
+                ],
+                skip_exported=False,
+            )["entities"]
+            for project in existing_projects:
+                existing_projects_index[existing_workspaces[project.workspace_id]].add(project.name)
+
+    with ThreadPoolExecutor(max_workers=PREFETCH_MAX_WORKERS) as executor:
+        projects = executor.map(lambda ws: get_projects(g.foreign_api, ws.id), workspaces)
+        foreign_projects: Dict[int, List[sly.ProjectInfo]] = {
+            ws.id: ws_projects for ws, ws_projects in zip(workspaces, projects)
+        }
+    return foreign_projects, existing_projects_index
+
+
+def get_files_tree_items(team_id: int, path: str) -> List[dict]:
+    files: List[FileInfo] = dir_cache.list(g.foreign_api, team_id, path)
+    # subdirectories are likely to be opened next
+    dir_cache.prefetch(g.foreign_api, team_id, [file.path for file in files if file.is_dir])
+    tree_items = []
+    for file in files:
+        path = file.path
+        if file.is_dir:
+            path = path.rstrip("/")
+        tree_items.append(
+            {
+                "path": path,
+                "type": "folder" if file.is_dir else "file",
+                "size": file.sizeb,
+                "id": file.id,
+            }
+        )
+    return tree_items
+
+
 @team_selector.table.click
 def show_team_stats(datapoint: Table.ClickedDataPoint):
     global team_id, tf_selector, need_password
@@ -199,6 +278,7 @@ def show_team_stats(datapoint: Table.ClickedDataPoint):
 
         start_import.hide()
         output_message.hide()
+        journal_flexbox.hide()
         team_selector.table.disable()
 
         row = datapoint.row
@@ -208,26 +288,24 @@ def show_team_stats(datapoint: Table.ClickedDataPoint):
         team_members_n = row[team_selector.TEAM_MEMBERS]
         labeling_jobs_n = row[team_selector.LABELING_JOBS]
         team_files_n = row[team_selector.TEAM_FILES]
+        team_selector.request_files_count(g.foreign_api, team_id)
 
         is_team_already_exists = False
-        existing_team = g.api.team.get_info_by_name(team_name)
+        existing_team = get_team_by_name(g.api, team_name)
         if existing_team is not None:
             is_team_already_exists = True
 
         team_selector.progress.set_message("Getting workspaces")
         # Workspaces sync
-        workspaces = g.foreign_api.workspace.get_list(team_id)
+        workspaces = get_workspaces(g.foreign_api, team_id)
+        foreign_projects, existing_projects_index = prefetch_projects(workspaces, existing_team)
         ws_items = []
         for ws in workspaces:
-            projects = g.foreign_api.project.get_list(ws.id)
+            projects = foreign_projects[ws.id]
 
-            is_ws_already_exists = False
-            if is_team_already_exists:
-                existing_ws = g.api.workspace.get_info_by_name(existing_team.id, ws.name)
-                if existing_ws is not None:
-                    is_ws_already_exists = True
-                    existing_projects = g.api.project.get_list(existing_ws.id)
-                    existing_projects_names = [project.name for project in existing_projects]
+            is_ws_already_exists = ws.name in existing_projects_index
+            if is_ws_already_exists:
+                existing_projects_names = existing_projects_index[ws.name]
 
             ws_title = ws.name
             if len(projects) == 0:
@@ -255,10 +333,10 @@ def show_team_stats(datapoint: Table.ClickedDataPoint):
 
         team_selector.progress.set_message("Getting team members")
         # Team Members sync
-        members = g.foreign_api.user.get_team_members(team_id)
+        members = get_team_members(g.foreign_api, team_id)
         if is_team_already_exists:
             existing_members_names = [
-                member.login for member in g.api.user.get_team_members(existing_team.id)
+                member.login for member in get_team_members(g.api, existing_team.id)
             ]
 
         new_member_items = []
@@ -283,25 +361,11 @@ def show_team_stats(datapoint: Table.ClickedDataPoint):
 
         team_selector.progress.set_message("Getting team files")
         # Team Files
-        files: List[FileInfo] = g.foreign_api.file.list(team_id, "/", False, return_type="fileinfo")
-        tree_items = []
-        for file in files:
-            path = file.path
-            if file.is_dir:
-                path = path.rstrip("/")
-            tree_items.append(
-                {
-                    "path": path,
-                    "type": "folder" if file.is_dir else "file",
-                    "size": file.sizeb,
-                    "id": file.id,
-                }
-            )
-        tf_selector.update_file_tree(files_list=tree_items)
+        tf_selector.update_file_tree(files_list=get_files_tree_items(team_id, "/"))
 
-        if len(files_collapse._widgets) > 0:
-            files_collapse._widgets.pop()
-        files_collapse._widgets.append(tf_selector)
+        if tf_selector in files_collapse._widgets:
+            files_collapse._widgets.remove(tf_selector)
+        files_collapse._widgets.insert(0, tf_selector)
         pbar.update()
 
         team_selector.progress.set_message("Almost done")
@@ -317,10 +381,32 @@ def show_team_stats(datapoint: Table.ClickedDataPoint):
 
         card.loading = False
         start_import.show()
+        show_journal_message()
         pbar.update()
         card.unlock()
 
 
+def show_journal_message():
+    journal = find_journal(g.data_dir, g.foreign_api.server_address, team_id, g.api.server_address)
+    if journal is None:
+        journal_flexbox.hide()
+        return
+    journal_message.set(
+        "Previous import of this team didn't finish. Import with the same settings will skip "
+        "entities imported before, import with other settings starts from scratch.",
+        status="warning",
+    )
+    journal_flexbox.show()
+
+
+@discard_journal.click
+def discard_previous_import():
+    journal = find_journal(g.data_dir, g.foreign_api.server_address, team_id, g.api.server_address)
+    if journal is not None:
+        journal.clear()
+    journal_flexbox.hide()
+
+
 @ws_import_checkbox.value_changed
 def ws_import_all(checked: bool):
     if checked:
@@ -333,21 +419,7 @@ def ws_import_all(checked: bool):
 def file_selector_path_changed(path: str):
     if path == "" or path is None:
         path = "/"
-    files: List[FileInfo] = g.foreign_api.file.list(team_id, path, False, return_type="fileinfo")
-    tree_items = []
-    for file in files:
-        path = file.path
-        if file.is_dir:
-            path = path.rstrip("/")
-        tree_items.append(
-            {
-                "path": path,
-                "type": "folder" if file.is_dir else "file",
-                "id": file.id,
-                "size": file.sizeb,
-            }
-        )
-    tf_selector.update_file_tree(files_list=tree_items)
+    tf_selector.update_file_tree(files_list=get_files_tree_items(team_id, path))
 
 
 @need_link_change.value_changed
@@ -442,6 +514,24 @@ def process_import():
         import_progress_3.show()
         import_progress_4.show()
 
+        journal_flexbox.hide()
+        settings = {
+            "workspaces": "all" if is_import_all_ws else get_ws_projects_map(ws_collapse),
+            "workspaces_collision": ws_collision_velue,
+            "fast_mode": is_fast_mode,
+            "members": members_collapse.get_transferred_items(),
+            "members_collision": members_collision.get_value(),
+            "files": tf_selector.get_selected_items(),
+            "files_collision": files_collision.get_value(),
+        }
+        journal = open_journal(
+            g.data_dir,
+            g.foreign_api.server_address,
+            team_id,
+            g.api.server_address,
+            settings,
+        )
+
         import_workspaces(
             g.api,
             g.foreign_api,
@@ -456,6 +546,7 @@ def process_import():
             is_fast_mode,
             change_link_flag,
             bucket_path,
+            journal=journal,
         )
 
         import_progress_2.hide(), import_progress_3.hide(), import_progress_4.hide()
@@ -471,6 +562,7 @@ def process_import():
             default_password,
             import_progress_1,
             ignore_users_collision,
+            journal=journal,
         )
         ##################
 
@@ -478,10 +570,20 @@ def process_import():
         remote_paths = tf_selector.get_selected_items()
         if len(remote_paths) > 0:
             import_team_files(
-                g.api, g.foreign_api, team_id, remote_paths, import_progress_1, import_progress_2
+                g.api,
+                g.foreign_api,
+                team_id,
+                remote_paths,
+                import_progress_1,
+                import_progress_2,
+                journal=journal,
+                files_collision=files_collision.get_value(),
             )
         ##################
 
+        # everything is imported, next import starts from scratch
+        journal.clear()
+
         output_message.set(text="Data have been successfully imported.", status="success")
         import_progress_1.hide()
         import_progress_2.hide()
@@ -491,4 +593,5 @@ def process_import():
     except Exception as e:
         output_message.set(text="Error occurred during import process. Please restart the app.", status="error")
         output_message.show()
+        show_journal_message()
         raise e
\ No newline at end of file
@@ -1,11 +1,18 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List, Tuple
 import pandas as pd
 import supervisely as sly
+from supervisely.app.content import DataJson
 from supervisely.app.widgets import (
     Card,
     Container,
     Progress,
     Table,
 )
+from src.cache import get_labeling_jobs, get_team_members, get_teams, get_workspaces
 
 TEAM_ID = "id".upper()
 TEAM_NAME = "name".upper()
@@ -14,6 +21,18 @@ TEAM_MEMBERS = "members".upper()
 LABELING_JOBS = "labeling jobs".upper()
 TEAM_FILES = "team files".upper()
 SELECT = "select".upper()
+STATS_COLUMNS = [WORKSPACES, TEAM_MEMBERS, LABELING_JOBS, TEAM_FILES]
+# shown in stats columns until the value is loaded
+LOADING = "..."
+# Team Files are listed recursively, which is the slowest request of the instance, so
+# they are counted only for teams of the first page and for teams the user selects
+NOT_COUNTED = "?"
+FILES_PREFETCH_ROWS = 5
+
+# number of teams whose stats are requested at the same time
+STATS_MAX_WORKERS = int(os.environ.get("STATS_MAX_WORKERS", 8))
+FILES_MAX_WORKERS = int(os.environ.get("FILES_MAX_WORKERS", 2))
+STATS_FLUSH_INTERVAL = 1
 
 columns = [TEAM_ID, TEAM_NAME, WORKSPACES, TEAM_MEMBERS, LABELING_JOBS, TEAM_FILES, SELECT]
 lines = []
@@ -27,34 +46,126 @@ container = Container([table, progress])
 card = Card(title="Select Team", content=container, lock_message="Connect to Supervisely Instance")
 card.lock()
 
+table_lock = threading.Lock()
+stats_generation = 0
+files_executor = ThreadPoolExecutor(max_workers=FILES_MAX_WORKERS)
+# files counts requested for the current table by team id
+files_futures = {}
+
+
+def get_team_stats(foreign_api: sly.Api, team_id: int) -> Dict[str, int]:
+    workspaces = get_workspaces(foreign_api, team_id)
+    team_members = get_team_members(foreign_api, team_id)
+    jobs = get_labeling_jobs(foreign_api, team_id)
+    return {
+        WORKSPACES: len(workspaces),
+        TEAM_MEMBERS: len(team_members),
+        LABELING_JOBS: len(jobs),
+    }
+
+
+def count_team_files(foreign_api: sly.Api, team_id: int) -> Dict[str, int]:
+    return {TEAM_FILES: len(foreign_api.file.list(team_id, "/", True))}
+
+
+def set_cells(generation: int, cells: List[Tuple[int, str, Any]]):
+    # several cells are changed at once and sent to the page with a single update,
+    # cells of an outdated table (e.g. after reconnect) are dropped
+    with table_lock:
+        if generation != stats_generation:
+            return
+        data = table._parsed_data["data"]
+        columns_idx = table._parsed_data["columns"]
+        rows = {row[columns_idx.index(TEAM_ID)]: row for row in data}
+        for team_id, column, value in cells:
+            row = rows.get(team_id)
+            if row is not None:
+                row[columns_idx.index(column)] = value
+        DataJson()[table.widget_id]["table_data"] = table._parsed_data
+        DataJson().send_changes()
+
+
+def load_stats(foreign_api: sly.Api, teams_ids: List[int], generation: int):
+    # Stats are requested by a few workers and filled into the table as they arrive,
+    # finished teams are flushed to the page at most every STATS_FLUSH_INTERVAL seconds.
+    def fetch(team_id: int):
+        try:
+            return get_team_stats(foreign_api, team_id)
+        except Exception as e:
+            sly.logger.warn(f"Failed to get stats of team {team_id}: {repr(e)}")
+            return {column: "-" for column in [WORKSPACES, TEAM_MEMBERS, LABELING_JOBS]}
+
+    with teams_progress(message="Fetching teams stats", total=len(teams_ids)) as pbar:
+        teams_progress.show()
+        with ThreadPoolExecutor(max_workers=STATS_MAX_WORKERS) as stats_executor:
+            futures = {stats_executor.submit(fetch, team_id): team_id for team_id in teams_ids}
+            cells = []
+            last_flush = time.monotonic()
+            for future in as_completed(futures):
+                stats = future.result()
+                pbar.update()
+                for column, value in stats.items():
+                    cells.append((futures[future], column, value))
+                if time.monotonic() - last_flush > STATS_FLUSH_INTERVAL:
+                    set_cells(generation, cells)
+                    cells, last_flush = [], time.monotonic()
+            set_cells(generation, cells)
+    teams_progress.hide()
+
+
+def count_files(foreign_api: sly.Api, team_id: int, generation: int):
+    if generation != stats_generation:
+        # table was built again while the request was waiting
+        return
+    set_cells(generation, [(team_id, TEAM_FILES, LOADING)])
+    try:
+        stats = count_team_files(foreign_api, team_id)
+    except Exception as e:
+        sly.logger.warn(f"Failed to count Team Files of team {team_id}: {repr(e)}")
+        stats = {TEAM_FILES: "-"}
+    set_cells(generation, [(team_id, column, value) for column, value in stats.items()])
+
+
+def request_files_count(foreign_api: sly.Api, team_id: int):
+    # Team Files of the team are counted in background once per table
+    with table_lock:
+        if team_id in files_futures:
+            return
+        files_futures[team_id] = files_executor.submit(
+            count_files, foreign_api, team_id, stats_generation
+        )
+
 
 def build_table(foreign_api: sly.Api):
-    global table, lines
+    # table is shown as soon as teams are listed, counts are loaded in background
+    global table, lines, stats_generation
     table.hide()
-    lines = []
     table.loading = True
-    teams = foreign_api.team.get_list()
-    with teams_progress(message="Fetching teams", total=len(teams)) as pbar:
-        teams_progress.show()
-        for info in teams:
-            workspaces = foreign_api.workspace.get_list(info.id)
-            team_members = foreign_api.user.get_team_members(info.id)
-            jobs = foreign_api.labeling_job.get_list(info.id)
-            team_files = foreign_api.file.list(info.id, "/", True)
-            lines.append(
-                [
-                    info.id,
-                    info.name or "-",
-                    len(workspaces),
-                    len(team_members),
-                    len(jobs),
-                    len(team_files),
-                    Table.create_button(SELECT),
-                ]
-            )
-            pbar.update()
+    teams = get_teams(foreign_api)
+    lines = [
+        [
+            info.id,
+            info.name or "-",
+            *[LOADING if column != TEAM_FILES else NOT_COUNTED for column in STATS_COLUMNS],
+            Table.create_button(SELECT),
+        ]
+        for info in teams
+    ]
     df = pd.DataFrame(lines, columns=columns)
-    table.read_pandas(df)
+    with table_lock:
+        stats_generation += 1
+        generation = stats_generation
+        # counts requested for the previous table are not needed anymore
+        for future in files_futures.values():
+            future.cancel()
+        files_futures.clear()
+        table.read_pandas(df)
     table.loading = False
-    teams_progress.hide()
     table.show()
+    threading.Thread(
+        target=load_stats,
+        args=(foreign_api, [info.id for info in teams], generation),
+        daemon=True,
+    ).start()
+    for info in teams[:FILES_PREFETCH_ROWS]:
+        request_files_count(foreign_api, info.id)